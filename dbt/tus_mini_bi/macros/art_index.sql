@@ -0,0 +1,49 @@
+{#-
+    ART indexes on the staging tables, keyed on the natural ids the facts look
+    rows up by.
+
+    The indexes only exist between runs. DuckDB will not rename a table that
+    still has an index, and with several dbt threads one model's rename races
+    the duckdb_indexes() scan another model's table materialization makes, so
+    on-run-start drops them all and on-run-end recreates them once every model
+    has been swapped in.
+-#}
+
+{% macro staging_art_indexes() -%}
+    {{ return({
+        'stg_students': [['student_id']],
+        'stg_programmes': [['programme_id']],
+        'stg_enrolments': [['student_id', 'programme_id', 'academic_year']],
+        'stg_academic_performance': [['student_id', 'academic_year']],
+    }) }}
+{%- endmacro %}
+
+{% macro art_index_name(table, columns) -%}
+{{ table }}__{{ columns | join('__') }}__idx
+{%- endmacro %}
+
+{% macro drop_staging_indexes() %}
+    {% if execute %}
+        {% for table, indexes in staging_art_indexes().items() %}
+            {% for columns in indexes %}
+                {% do run_query('drop index if exists ' ~ target.schema ~ '.' ~ art_index_name(table, columns)) %}
+            {% endfor %}
+        {% endfor %}
+    {% endif %}
+{% endmacro %}
+
+{% macro create_staging_indexes() %}
+    {% if execute %}
+        {% for table, indexes in staging_art_indexes().items() %}
+            {% set relation = adapter.get_relation(database=target.database, schema=target.schema, identifier=table) %}
+            {% if relation is not none and relation.type == 'table' %}
+                {% for columns in indexes %}
+                    {% do run_query(
+                        'create index if not exists ' ~ art_index_name(table, columns)
+                        ~ ' on ' ~ relation ~ ' (' ~ columns | join(', ') ~ ')'
+                    ) %}
+                {% endfor %}
+            {% endif %}
+        {% endfor %}
+    {% endif %}
+{% endmacro %}
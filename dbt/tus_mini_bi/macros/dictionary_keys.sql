@@ -0,0 +1,9 @@
+{#-
+    student_key and programme_key come from the append-only key dictionaries
+    stg_student_keys and stg_programme_keys, not from the ids themselves.
+-#}
+
+{% macro academic_year_key(column) %}
+{#- Integer key for an academic year: its start year, so '2022/23' -> 2022 -#}
+cast(substr({{ column }}, 1, 4) as integer)
+{%- endmacro %}
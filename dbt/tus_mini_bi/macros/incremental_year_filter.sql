@@ -0,0 +1,77 @@
+{% macro incremental_year_filter(year_column='academic_year', lookback=0) %}
+{#-
+    Incremental watermark on dim_academic_year.year_index.
+
+    On incremental runs, keeps only academic years at or after the latest year
+    already in {{ this }}, or the earliest year the loader has rewritten since
+    the model's last build (raw._load_changes against _incremental_watermarks)
+    if that is earlier, minus `lookback` years; on full builds it is a no-op.
+    A change logged without a year (a full reload, a student or programme
+    correction) reprocesses every year. The window always runs to the latest
+    year, so models that look ahead to the following year keep their input.
+    The latest loaded year is always reprocessed because a new extract can
+    still add to it.
+-#}
+{%- if is_incremental() -%}
+    {%- set changes = adapter.get_relation(database=this.database, schema='raw', identifier='_load_changes') -%}
+    {{ year_column }} in (
+        select yr.academic_year
+        from {{ ref('dim_academic_year') }} yr
+        where yr.year_index >= least(
+            (
+                select coalesce(max(loaded.year_index), 0)
+                from {{ this }} t
+                join {{ ref('dim_academic_year') }} loaded
+                    on t.academic_year = loaded.academic_year
+            ),
+            {%- if changes is not none %}
+            (
+                -- null when nothing changed; 0 (every year) for yearless changes
+                select min(coalesce(changed.year_index, 0))
+                from {{ changes }} c
+                left join {{ ref('dim_academic_year') }} changed
+                    on c.academic_year = changed.academic_year
+                where c.loaded_at > (
+                    select coalesce(max(w.built_at), '-infinity'::timestamp)
+                    from {{ incremental_watermarks_relation() }} w
+                    where w.model = '{{ this.identifier }}'
+                )
+            )
+            {%- else %}
+            null
+            {%- endif %}
+        ) - {{ lookback }}
+    )
+{%- else -%}
+    true
+{%- endif -%}
+{% endmacro %}
+
+{% macro incremental_watermarks_relation() -%}
+    {{ target.schema }}._incremental_watermarks
+{%- endmacro %}
+
+{#- on-run-start: one row per incremental model, the time of its last successful build -#}
+{% macro create_incremental_watermarks() %}
+    create table if not exists {{ incremental_watermarks_relation() }} (
+        model varchar primary key,
+        built_at timestamp
+    )
+{% endmacro %}
+
+{#-
+    post-hook of each model that uses incremental_year_filter: delete+insert only
+    replaces the years it selected, so rows of an academic year that is no longer
+    in the data (a regenerated snapshot without a delta year, a removed
+    partition) are deleted here
+-#}
+{% macro delete_vanished_years() %}
+    delete from {{ this }}
+    where academic_year not in (select academic_year from {{ ref('dim_academic_year') }})
+{% endmacro %}
+
+{#- post-hook of each model that uses incremental_year_filter -#}
+{% macro record_incremental_watermark() %}
+    insert or replace into {{ incremental_watermarks_relation() }}
+    values ('{{ this.identifier }}', current_timestamp)
+{% endmacro %}
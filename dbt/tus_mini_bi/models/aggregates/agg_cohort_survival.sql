@@ -0,0 +1,76 @@
+{{ config(materialized='table') }}
+
+-- Survival curves of each entry cohort (Year 1 entrants) per entry programme.
+-- Grain: cohort academic_year x entry programme x year_offset (0 = entry year),
+-- for every offset the data already covers. Counts only, as in agg_retention_kpi:
+--   survival                  = sum(surviving_count) / sum(cohort_size)
+--   same-programme survival   = sum(surviving_same_programme_count) / sum(cohort_size)
+--   exit hazard at an offset  = sum(exited_count) / previous offset's sum(surviving_count)
+-- A student survives to an offset while continuously enrolled since entry; one
+-- who leaves and later returns counts from their first exit.
+
+with cohort as (
+
+    select
+        cohort_academic_year,
+        cohort_year_index,
+        entry_programme_key,
+        entry_programme_id,
+        years_observed,
+        exit_year_offset,
+        first_transfer_year_offset
+    from {{ ref('fact_cohort_trajectory') }}
+    where entrant_flag = 1
+
+),
+
+offsets as (
+
+    select
+        *,
+        unnest(range(years_observed + 1)) as year_offset
+    from cohort
+
+),
+
+prog as (
+
+    select
+        programme_key,
+        programme_name,
+        faculty,
+        campus
+    from {{ ref('dim_programme') }}
+
+),
+
+final as (
+
+    select
+        o.cohort_academic_year,
+        o.cohort_year_index,
+        o.entry_programme_id as programme_id,
+        prog.programme_name,
+        prog.faculty,
+        prog.campus,
+        o.year_offset,
+
+        count(*) as cohort_size,
+        count(*) filter (
+            where o.exit_year_offset is null or o.exit_year_offset >= o.year_offset
+        ) as surviving_count,
+        count(*) filter (
+            where (o.exit_year_offset is null or o.exit_year_offset >= o.year_offset)
+              and (o.first_transfer_year_offset is null or o.first_transfer_year_offset >= o.year_offset)
+        ) as surviving_same_programme_count,
+        -- Left after the previous offset's year
+        count(*) filter (where o.exit_year_offset = o.year_offset - 1) as exited_count
+
+    from offsets o
+    left join prog
+        on o.entry_programme_key = prog.programme_key
+    group by all
+
+)
+
+select * from final
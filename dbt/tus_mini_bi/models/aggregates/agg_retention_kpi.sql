@@ -0,0 +1,100 @@
+{{ config(materialized='table') }}
+
+-- Pre-aggregated Year 1 KPI cube for the dashboards.
+-- Grain: academic_year x programme x faculty x campus x risk_band x gpa_band.
+-- Stores numerators and denominators (not rates) so any roll-up re-aggregates correctly:
+--   institutional retention   = sum(retained_institution_count) / sum(retention_eligible_count)
+--   same-programme retention  = sum(retained_same_programme_count) / sum(retention_eligible_count)
+--   average success score     = sum(risk_score_sum) / sum(entrant_count)
+
+with enrol as (
+
+    select
+        student_key,
+        programme_key,
+        academic_year_key,
+        programme_id,
+        academic_year,
+        gpa_band
+    from {{ ref('fact_enrolment_year') }}
+    where entrant_flag = 1
+
+),
+
+ret as (
+
+    select
+        student_key,
+        programme_key,
+        academic_year_key,
+        retained_institution_next_year_flag,
+        retained_same_programme_next_year_flag
+    from {{ ref('fact_retention_outcome') }}
+
+),
+
+risk as (
+
+    select
+        student_key,
+        programme_key,
+        academic_year_key,
+        risk_score,
+        risk_band
+    from {{ ref('fact_student_success_score') }}
+
+),
+
+prog as (
+
+    select
+        programme_key,
+        programme_name,
+        faculty,
+        campus
+    from {{ ref('dim_programme') }}
+
+),
+
+yr as (
+
+    select
+        academic_year_key,
+        year_index
+    from {{ ref('dim_academic_year') }}
+
+),
+
+final as (
+
+    select
+        e.academic_year,
+        yr.year_index,
+        e.programme_id,
+        prog.programme_name,
+        prog.faculty,
+        prog.campus,
+        rsk.risk_band,
+        e.gpa_band,
+
+        count(*) as entrant_count,
+        -- Final-year entrants have no next year to observe, so they are excluded from rate denominators
+        count(ret.retained_institution_next_year_flag) as retention_eligible_count,
+        coalesce(sum(ret.retained_institution_next_year_flag), 0) as retained_institution_count,
+        coalesce(sum(ret.retained_same_programme_next_year_flag), 0) as retained_same_programme_count,
+        sum(rsk.risk_score) as risk_score_sum
+
+    from enrol e
+    left join ret
+        on e.student_key = ret.student_key and e.programme_key = ret.programme_key and e.academic_year_key = ret.academic_year_key
+    left join risk rsk
+        on e.student_key = rsk.student_key and e.programme_key = rsk.programme_key and e.academic_year_key = rsk.academic_year_key
+    left join prog
+        on e.programme_key = prog.programme_key
+    left join yr
+        on e.academic_year_key = yr.academic_year_key
+    group by all
+
+)
+
+select * from final
@@ -18,6 +18,7 @@ parsed as (
 
 final as (
     select 
+        start_year as academic_year_key,
         academic_year, 
         start_year,
         end_year,
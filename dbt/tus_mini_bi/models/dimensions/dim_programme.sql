@@ -1,6 +1,7 @@
 {{ config(materialized='table') }}
 
 select 
+    programme_key,
     programme_id,
     programme_name,
     faculty,
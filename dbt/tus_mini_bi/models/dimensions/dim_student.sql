@@ -3,6 +3,7 @@
 with base as (
 
     select 
+        student_key,
         student_id,
         gender,
         date_of_birth,
@@ -16,6 +17,7 @@ with base as (
 final as (
 
     select 
+        student_key,
         student_id,
         gender,
 
@@ -0,0 +1,108 @@
+{{ config(materialized='table') }}
+
+-- One row per student with their year-by-year path, so progression questions
+-- (Y1 -> Y3, time to exit, transfer paths) need no self-joins of fact_enrolment_year.
+-- Each step holds the student's programme and year of study that year, and what
+-- happened by the next academic year (the look-ahead of fact_retention_outcome):
+--   Retained     same programme, next year of study
+--   Repeated     same programme, same year of study
+--   Transferred  different programme
+--   Exited       not enrolled the next academic year
+--   null         final academic year in the data, not yet observable
+-- Rebuilt in full: every new year extends the trajectories of all continuing students.
+
+with years as (
+
+    select
+        academic_year_key,
+        year_index,
+        max(year_index) over () as last_year_index
+    from {{ ref('dim_academic_year') }}
+
+),
+
+-- All look-aheads share one window, so DuckDB sorts the enrolments once
+steps as (
+
+    select
+        e.student_key,
+        e.student_id,
+        e.programme_key,
+        e.programme_id,
+        e.academic_year,
+        e.year_of_study,
+        e.entrant_flag,
+        y.year_index,
+        y.last_year_index,
+        y.year_index - first_value(y.year_index) over w as year_offset,
+        lead(y.year_index) over w as next_year_index,
+        lead(e.programme_key) over w as next_programme_key,
+        lead(e.year_of_study) over w as next_year_of_study
+    from {{ ref('fact_enrolment_year') }} e
+    join years y
+        on e.academic_year_key = y.academic_year_key
+    window w as (partition by e.student_key order by y.year_index)
+
+),
+
+states as (
+
+    select
+        *,
+        case
+            when year_index = last_year_index then null
+            when next_year_index is null or next_year_index > year_index + 1 then 'Exited'
+            when next_programme_key <> programme_key then 'Transferred'
+            when next_year_of_study <= year_of_study then 'Repeated'
+            else 'Retained'
+        end as state
+    from steps
+
+),
+
+final as (
+
+    select
+        student_key,
+        any_value(student_id) as student_id,
+
+        -- Cohort: the student's first academic year in the data
+        min(year_index) as cohort_year_index,
+        arg_min(academic_year, year_index) as cohort_academic_year,
+        arg_min(programme_key, year_index) as entry_programme_key,
+        arg_min(programme_id, year_index) as entry_programme_id,
+        -- 0 for students already past Year 1 when the data starts (left-censored)
+        arg_min(entrant_flag, year_index) as entrant_flag,
+
+        arg_max(programme_id, year_index) as latest_programme_id,
+        arg_max(year_of_study, year_index) as latest_year_of_study,
+        count(*) as years_enrolled,
+        -- Academic years after the cohort year that the data covers
+        any_value(last_year_index) - min(year_index) as years_observed,
+
+        -- year_offset of the first exit; null if never exited
+        min(year_offset) filter (where state = 'Exited') as exit_year_offset,
+        min(year_offset) filter (where state = 'Transferred') as first_transfer_year_offset,
+        count(*) filter (where state = 'Transferred') as transfer_count,
+        count(*) filter (where state = 'Repeated') as repeat_count,
+        -- Enrolled if present in the final academic year of the data
+        case when max(year_index) = any_value(last_year_index) then 'Enrolled' else 'Exited' end as current_status,
+
+        -- year_offset is the first struct field, so sorting the list orders it by year;
+        -- much cheaper than an ordered aggregate (list(... order by ...))
+        list_sort(list(
+            {
+                'year_offset': year_offset,
+                'academic_year': academic_year,
+                'programme_id': programme_id,
+                'year_of_study': year_of_study,
+                'state': state
+            }
+        )) as trajectory
+
+    from states
+    group by student_key
+
+)
+
+select * from final
@@ -1,10 +1,20 @@
-{{ config(materialized='table') }}
+{{
+    config(
+        materialized='incremental',
+        incremental_strategy='delete+insert',
+        unique_key='academic_year',
+        post_hook=["{{ delete_vanished_years() }}", "{{ record_incremental_watermark() }}"]
+    )
+}}
+
+-- depends_on: {{ ref('dim_academic_year') }}
 
 with e as (
 
     select *
     from {{ ref('stg_enrolments') }}
     where registration_status = 'Registered'
+      and {{ incremental_year_filter() }}
 
 ),
 
@@ -17,7 +27,7 @@ e_dedup as (
         select 
             e.*, 
             row_number() over (
-                partition by student_id, programme_id, academic_year
+                partition by student_key, programme_key, academic_year_key
                 order by entrant_flag desc, year_of_study desc
             ) as rn
         from e
@@ -28,17 +38,18 @@ e_dedup as (
 p as (
 
     select 
-        student_id,
-        academic_year,
+        student_key,
+        academic_year_key,
         gpa,
         attendance_rate
     from {{ ref('stg_academic_performance') }}
+    where {{ incremental_year_filter() }}
 ),
 
 prog as (
 
     select 
-        programme_id,
+        programme_key,
         mode
     from {{ ref('dim_programme') }}
 ),
@@ -46,6 +57,9 @@ prog as (
 final as (
 
     select 
+        e.student_key,
+        e.programme_key,
+        e.academic_year_key,
         e.student_id,
         e.programme_id,
         e.academic_year,
@@ -72,17 +86,17 @@ final as (
 
         case
            when p.attendance_rate is null then 'Unknown'
-           when p.attendance_rate < 0.70 then 'Low'
-           when p.attendance_rate < 0.9 then 'Medium'
+           when p.attendance_rate < 70 then 'Low'
+           when p.attendance_rate < 90 then 'Medium'
            else 'High'
         end as attendance_band
     
     from e_dedup e
     left join prog
-       on e.programme_id = prog.programme_id
+       on e.programme_key = prog.programme_key
     left join p
-         on e.student_id = p.student_id
-        and e.academic_year = p.academic_year
+         on e.student_key = p.student_key
+        and e.academic_year_key = p.academic_year_key
 
 )
 
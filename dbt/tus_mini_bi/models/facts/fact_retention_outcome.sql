@@ -1,22 +1,35 @@
-{{ config(materialized='table') }}
+{{
+    config(
+        materialized='incremental',
+        incremental_strategy='delete+insert',
+        unique_key='academic_year',
+        post_hook=["{{ delete_vanished_years() }}", "{{ record_incremental_watermark() }}"]
+    )
+}}
 
 with base as (
 
     select
+        student_key,
+        programme_key,
+        academic_year_key,
         student_id,
         programme_id,
         academic_year,
         year_of_study
     from {{ ref('fact_enrolment_year') }}
+    -- A new or changed year also changes the previous year's look-ahead flags
+    where {{ incremental_year_filter(lookback=1) }}
 
 ),
 
--- Create a mapping from academic_year to next academic_year
+-- Position of each academic year and of the year that follows it
 year_map as (
 
     select
-        academic_year as year_n,
-        lead(academic_year) over (order by year_index) as year_n1
+        academic_year_key,
+        year_index,
+        lead(year_index) over (order by year_index) as next_year_index
     from {{ ref('dim_academic_year') }}
 
 ),
@@ -25,62 +38,52 @@ n as (
 
     select
         b.*,
-        ym.year_n1 as next_academic_year
+        ym.year_index,
+        ym.next_year_index
     from base b
     left join year_map ym
-        on b.academic_year = ym.year_n
+        on b.academic_year_key = ym.academic_year_key
 
 ),
 
-next_year_any as (
+-- One row per student and year they were enrolled, keyed to the *previous* year
+-- so a single equi-join answers both look-ahead questions
+next_year_presence as (
 
-    select distinct
-        student_id,
-        academic_year
-    from base
-
-),
-
-next_year_same_prog as (
-
-    select distinct
-        student_id,
-        programme_id,
-        academic_year
-    from base
+    select
+        student_key,
+        year_index - 1 as year_index,
+        list(distinct programme_key) as next_year_programmes
+    from n
+    group by student_key, year_index
 
 ),
 
 final as (
 
     select
+        n.student_key,
+        n.programme_key,
+        n.academic_year_key,
         n.student_id,
         n.programme_id,
         n.academic_year,
 
         case
-            when n.next_academic_year is null then null
-            when exists (
-                select 1
-                from next_year_any a
-                where a.student_id = n.student_id
-                  and a.academic_year = n.next_academic_year
-            ) then 1 else 0
+            when n.next_year_index is null then null
+            when nx.student_key is not null then 1 else 0
         end as retained_institution_next_year_flag,
 
         case
-            when n.next_academic_year is null then null
-            when exists (
-                select 1
-                from next_year_same_prog sp
-                where sp.student_id = n.student_id
-                  and sp.programme_id = n.programme_id
-                  and sp.academic_year = n.next_academic_year
-            ) then 1 else 0
+            when n.next_year_index is null then null
+            when list_contains(nx.next_year_programmes, n.programme_key) then 1 else 0
         end as retained_same_programme_next_year_flag
 
     from n
+    left join next_year_presence nx
+        on n.student_key = nx.student_key
+       and n.year_index = nx.year_index
 
 )
 
-select * from final
\ No newline at end of file
+select * from final
@@ -1,21 +1,34 @@
-{{ config(materialized='table') }}
+{{
+    config(
+        materialized='incremental',
+        incremental_strategy='delete+insert',
+        unique_key='academic_year',
+        post_hook=["{{ delete_vanished_years() }}", "{{ record_incremental_watermark() }}"]
+    )
+}}
+
+-- depends_on: {{ ref('dim_academic_year') }}
 
 with enrol as (
 
     select
+        student_key,
+        programme_key,
+        academic_year_key,
         student_id,
         programme_id,
         academic_year,
         gpa_band,
         attendance_band
     from {{ ref('fact_enrolment_year') }}
+    where {{ incremental_year_filter() }}
 
 ),
 
 student_dim as (
 
     select
-        student_id,
+        student_key,
         access_flag
     from {{ ref('dim_student') }}
 
@@ -24,6 +37,9 @@ student_dim as (
 scored as (
 
     select
+        e.student_key,
+        e.programme_key,
+        e.academic_year_key,
         e.student_id,
         e.programme_id,
         e.academic_year,
@@ -31,7 +47,7 @@ scored as (
         -- GPA component
         case
             when e.gpa_band = 'Low' then 2
-            when e.gpa_band = 'Med' then 1
+            when e.gpa_band = 'Medium' then 1
             when e.gpa_band = 'High' then 0
             else 1
         end as gpa_score,
@@ -39,7 +55,7 @@ scored as (
         -- Attendance component
         case
             when e.attendance_band = 'Low' then 2
-            when e.attendance_band = 'Med' then 1
+            when e.attendance_band = 'Medium' then 1
             when e.attendance_band = 'High' then 0
             else 1
         end as attendance_score,
@@ -52,13 +68,16 @@ scored as (
 
     from enrol e
     left join student_dim s
-        on e.student_id = s.student_id
+        on e.student_key = s.student_key
 
 ),
 
 final as (
 
     select
+        student_key,
+        programme_key,
+        academic_year_key,
         student_id,
         programme_id,
         academic_year,
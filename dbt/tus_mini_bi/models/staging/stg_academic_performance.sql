@@ -1,4 +1,4 @@
-{{ config(materialized='view') }}
+{{ config(materialized='table') }}
 
 with src as (
     select * from {{ source('raw', 'academic_performance') }}
@@ -6,11 +6,18 @@ with src as (
 
 cleaned as (
     select
-        cast(student_id as varchar) as student_id,
-        cast(academic_year as varchar) as academic_year,
-        try_cast(gpa as double) as gpa,
-        try_cast(attendance_rate as double) as attendance_rate
+        -- Integer keys for joins, from the key dictionaries (see stg_student_keys)
+        sk.student_key,
+        {{ academic_year_key('academic_year') }} as academic_year_key,
+
+        -- raw columns are loaded with explicit types (see raw_sources.yml), no casts needed
+        student_id,
+        academic_year,
+        gpa,
+        attendance_rate
     from src
+    left join {{ ref('stg_student_keys') }} sk using (student_id)
 )
 
-select * from cleaned
\ No newline at end of file
+select * from cleaned
+order by academic_year_key, student_key
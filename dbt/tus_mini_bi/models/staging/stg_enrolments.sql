@@ -1,4 +1,4 @@
-{{ config(materialized='view') }}
+{{ config(materialized='table') }}
 
 with src as (
     select * from {{ source('raw', 'enrolments') }}
@@ -6,22 +6,26 @@ with src as (
 
 cleaned as (
     select
-        cast(student_id as varchar) as student_id,
-        cast(programme_id as varchar) as programme_id,
-        cast(academic_year as varchar) as academic_year,
-        try_cast(year_of_study as integer) as year_of_study,
+        -- Integer keys for joins, from the key dictionaries (see stg_student_keys)
+        sk.student_key,
+        pk.programme_key,
+        {{ academic_year_key('academic_year') }} as academic_year_key,
 
-        case
-            when registration_status is null then 'Unknown'
-            when lower(trim(registration_status)) = 'registered' then 'Registered'
-            when lower(trim(registration_status)) = 'withdrawn' then 'Withdrawn'
-            when lower(trim(registration_status)) = 'deferred' then 'Deferred'
-            else 'Unknown'
-        end as registration_status,
+        -- raw columns are loaded with explicit types (see raw_sources.yml), no casts needed
+        student_id,
+        programme_id,
+        academic_year,
+        year_of_study,
 
-        try_cast(entrant_flag as integer) as entrant_flag
+        -- registration_status is an ENUM of the clean values, only nulls need mapping
+        coalesce(cast(registration_status as varchar), 'Unknown') as registration_status,
+
+        entrant_flag
 
     from src
+    left join {{ ref('stg_student_keys') }} sk using (student_id)
+    left join {{ ref('stg_programme_keys') }} pk using (programme_id)
 )
 
-select * from cleaned
\ No newline at end of file
+select * from cleaned
+order by academic_year_key, student_key
@@ -0,0 +1,31 @@
+{{ config(materialized='incremental', incremental_strategy='append') }}
+
+-- Dictionary of programme ids, built like stg_student_keys: keys are assigned
+-- in id order when an id first appears and are never reused or changed.
+
+with ids as (
+
+    select programme_id from {{ source('raw', 'programmes') }}
+    union
+    select programme_id from {{ source('raw', 'enrolments') }}
+
+),
+
+new_ids as (
+
+    select programme_id
+    from ids
+    where programme_id is not null
+    {% if is_incremental() %}
+        and programme_id not in (select programme_id from {{ this }})
+    {% endif %}
+
+)
+
+select
+    programme_id,
+    {% if is_incremental() %}
+        (select coalesce(max(programme_key), 0) from {{ this }}) +
+    {% endif %}
+    row_number() over (order by programme_id) as programme_key
+from new_ids
@@ -1,4 +1,4 @@
-{{ config(materialized='view') }}
+{{ config(materialized='table') }}
 
 with src as (
     select * from {{ source('raw', 'programmes') }}
@@ -6,7 +6,8 @@ with src as (
 
 cleaned as (
     select
-        cast(programme_id as varchar) as programme_id,
+        k.programme_key,
+        programme_id,
         trim(programme_name) as programme_name,
 
         -- faculty may have lowercase noise from simulation
@@ -25,14 +26,10 @@ cleaned as (
                 end
         end as faculty,
 
-        try_cast(nfq_level as integer) as nfq_level,
+        nfq_level,
 
-        case
-            when mode is null then 'Unknown'
-            when upper(trim(mode)) in ('FT', 'FULL-TIME', 'FULL TIME') then 'FT'
-            when upper(trim(mode)) in ('PT', 'PART-TIME', 'PART TIME') then 'PT'
-            else 'Unknown'
-        end as mode,
+        -- mode is an ENUM('FT', 'PT') in raw, only nulls need mapping
+        coalesce(cast(mode as varchar), 'Unknown') as mode,
 
         case
             when campus is null then 'Unknown'
@@ -40,6 +37,8 @@ cleaned as (
         end as campus
 
     from src
+    left join {{ ref('stg_programme_keys') }} k using (programme_id)
 )
 
-select * from cleaned
\ No newline at end of file
+select * from cleaned
+order by programme_key
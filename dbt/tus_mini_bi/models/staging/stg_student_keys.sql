@@ -0,0 +1,38 @@
+{{ config(materialized='incremental', incremental_strategy='append') }}
+
+-- Dictionary of student ids: one integer student_key per student_id, assigned
+-- in id order the first time the id appears in any extract and never changed
+-- afterwards, so the keys stored on the incremental facts stay valid. Ids that
+-- only occur in enrolments or performance rows get keys too, so orphan rows
+-- keep a key the star-schema audit can report.
+-- A --full-refresh renumbers the keys, so rebuild the models that carry them
+-- with it.
+
+with ids as (
+
+    select student_id from {{ source('raw', 'students') }}
+    union
+    select student_id from {{ source('raw', 'enrolments') }}
+    union
+    select student_id from {{ source('raw', 'academic_performance') }}
+
+),
+
+new_ids as (
+
+    select student_id
+    from ids
+    where student_id is not null
+    {% if is_incremental() %}
+        and student_id not in (select student_id from {{ this }})
+    {% endif %}
+
+)
+
+select
+    student_id,
+    {% if is_incremental() %}
+        (select coalesce(max(student_key), 0) from {{ this }}) +
+    {% endif %}
+    row_number() over (order by student_id) as student_key
+from new_ids
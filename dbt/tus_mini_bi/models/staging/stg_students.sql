@@ -1,4 +1,4 @@
-{{ config(materialized='view') }}
+{{ config(materialized='table') }}
 
 with src as (
 
@@ -10,7 +10,8 @@ with src as (
 cleaned as (
 
     select
-        cast(student_id as varchar) as student_id,
+        k.student_key,
+        student_id,
 
         case
             when gender is null then 'Other/Unknown'
@@ -22,7 +23,7 @@ cleaned as (
             else 'Other/Unknown'
         end as gender,
 
-        try_cast(date_of_birth as date) as date_of_birth,
+        date_of_birth,
 
         case
             when entry_route is null then 'Unknown'
@@ -34,7 +35,7 @@ cleaned as (
             else 'Unknown'
         end as entry_route,
 
-        try_cast(access_flag as integer) as access_flag,
+        access_flag,
 
         case
             when nationality_group is null then 'Unknown'
@@ -50,7 +51,9 @@ cleaned as (
         end as home_campus
 
     from src
+    left join {{ ref('stg_student_keys') }} k using (student_id)
 
 )
 
-select * from cleaned
\ No newline at end of file
+select * from cleaned
+order by student_key
@@ -0,0 +1,62 @@
+"""
+Arrow handoff between DuckDB and the Python stages.
+
+DuckDB results are columnar already; going through .df() builds a second,
+NumPy/object copy of every column. These helpers keep data in Arrow instead:
+
+    record_batches(con, sql)        stream a query as a RecordBatchReader (bounded memory)
+    arrow_frame(con, sql)           pandas DataFrame backed by the Arrow buffers (pd.ArrowDtype)
+    write_arrow_file(con, sql, p)   stream a query into an uncompressed Arrow IPC (Feather v2) file
+    read_arrow_file(p)              memory-map such a file; pages are loaded on access, not copied
+
+Arrow-backed columns support the usual pandas operations (filters, merges,
+groupby); missing values are pd.NA rather than NaN.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+# DuckDB vectors are 2,048 rows; batches of whole vectors avoid re-chunking
+ROWS_PER_BATCH = 64 * 2048
+
+
+def record_batches(con: duckdb.DuckDBPyConnection, sql: str, rows_per_batch: int = ROWS_PER_BATCH) -> pa.RecordBatchReader:
+    """The result of `sql` as a stream of Arrow record batches."""
+    result = con.execute(sql)
+    # to_arrow_reader replaced fetch_record_batch in DuckDB 1.5
+    reader = getattr(result, "to_arrow_reader", None) or result.fetch_record_batch
+    return reader(rows_per_batch)
+
+
+def to_pandas(data: pa.Table | pa.RecordBatch) -> pd.DataFrame:
+    """Arrow data as a pandas DataFrame of pd.ArrowDtype columns, without converting the buffers."""
+    return data.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def arrow_frame(con: duckdb.DuckDBPyConnection, sql: str) -> pd.DataFrame:
+    return to_pandas(record_batches(con, sql).read_all())
+
+
+def write_arrow_file(
+    con: duckdb.DuckDBPyConnection, sql: str, path: str | Path, rows_per_batch: int = ROWS_PER_BATCH
+) -> int:
+    """
+    Streams `sql` into an Arrow IPC file one batch at a time and returns the row
+    count. The file is left uncompressed so read_arrow_file can map it.
+    """
+    reader = record_batches(con, sql, rows_per_batch)
+    rows = 0
+    with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, reader.schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+
+def read_arrow_file(path: str | Path) -> pa.Table:
+    """A memory-mapped, zero-copy view of an Arrow IPC file written by write_arrow_file."""
+    return pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
@@ -0,0 +1,122 @@
+"""
+Runs the star-schema audit against a built warehouse and times each check.
+
+audit_star_schema answers every check in one query, so the per-check timings
+come from DuckDB's profiler: each enrol_missing_* check is one hash join in the
+plan, identified by the table on its build side.
+
+    python scripts/audit_warehouse.py --db-path duckdb/warehouse.duckdb
+
+Exits non-zero when any enrolment row is missing a dimension or fact row.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+import duckdb
+import pandas as pd
+
+from pipeline_trace import span
+
+DB_PATH = "duckdb/warehouse.duckdb"
+
+# Build-side table of each coverage join -> the audit column it fills
+CHECKS = {
+    "dim_student": "enrol_missing_student_dim",
+    "dim_programme": "enrol_missing_programme_dim",
+    "dim_academic_year": "enrol_missing_year_dim",
+    "fact_retention_outcome": "enrol_missing_retention_fact",
+    "fact_student_success_score": "enrol_missing_risk_fact",
+}
+
+
+def _scanned_table(node: dict) -> str | None:
+    table = (node.get("extra_info") or {}).get("Table")
+    if table:
+        return table.split(".")[-1]
+    for child in node["children"]:
+        found = _scanned_table(child)
+        if found:
+            return found
+    return None
+
+
+def check_timings(profile: dict) -> dict[str, float]:
+    """Operator seconds of each coverage join (plus its build-side scan) in a JSON query profile."""
+    timings: dict[str, float] = {}
+
+    def walk(node: dict) -> None:
+        if node.get("operator_name") == "HASH_JOIN" and len(node["children"]) == 2:
+            build = node["children"][1]
+            check = CHECKS.get(_scanned_table(build))
+            if check:
+                timings[check] = node["operator_timing"] + build["operator_timing"]
+        for child in node["children"]:
+            walk(child)
+
+    walk(profile)
+    return {check: timings[check] for check in CHECKS.values() if check in timings}
+
+
+def run_audit(con: duckdb.DuckDBPyConnection) -> tuple[pd.Series, dict[str, float]]:
+    """
+    Queries main.audit_star_schema once with profiling on. Returns the audit row
+    and phase timings: the whole query, then each check's share of it.
+    """
+    fd, profile_path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        con.execute("set enable_profiling = 'json'")
+        con.execute(f"set profiling_output = '{profile_path}'")
+        with span("audit.star_schema") as s:
+            start = time.perf_counter()
+            star = con.execute("select * from main.audit_star_schema").df().iloc[0]
+            elapsed = time.perf_counter() - start
+            s.set(rows=int(star["enrol_rows_checked"]))
+        con.execute("set enable_profiling = 'no_output'")
+        with open(profile_path) as f:
+            profile = json.load(f)
+    finally:
+        os.remove(profile_path)
+
+    return star, {"audit query": elapsed, **check_timings(profile)}
+
+
+def failed_checks(star: pd.Series) -> dict[str, int]:
+    return {k: int(v) for k, v in star.items() if k.startswith("enrol_missing_") and v}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-path", type=Path, default=DB_PATH)
+    args = parser.parse_args(argv)
+
+    con = duckdb.connect(str(args.db_path), read_only=True)
+    star, timings = run_audit(con)
+    con.close()
+
+    print("=== Star schema audit ===")
+    for column, value in star.items():
+        print(f"{column:<30}{'' if pd.isna(value) else f'{value:,.0f}':>14}")
+    if pd.notna(star["audit_sample_percent"]):
+        print(f"(coverage checked on a {star['audit_sample_percent']:g}% sample)")
+
+    print("\n=== Audit timings ===")
+    for check, seconds in timings.items():
+        print(f"{check:<30}{seconds:>13.3f}s")
+
+    gaps = failed_checks(star)
+    if gaps:
+        print(f"\n❌ Star schema audit failed: {gaps}")
+        sys.exit(1)
+    print("\n✅ Star schema audit passed.")
+
+
+if __name__ == "__main__":
+    main()
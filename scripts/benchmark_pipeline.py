@@ -0,0 +1,281 @@
+"""
+End-to-end pipeline benchmark at fixed scale factors.
+
+For each scale factor (SF1 = the default 2,400 entrants/year, SF10 = 24,000, ...)
+a fresh dataset and warehouse are built under --work-dir and every stage is
+timed: generate_data, load_raw_to_duckdb, each dbt model, the audit views and
+export_for_tableau. A steady-state refresh follows: one academic year of change
+files (generate_data --delta) through the incremental loader and models, timed
+as delta:* stages. Wall time, peak RSS and rows/sec are written to a JSON
+results file and compared against a stored baseline.
+
+    python scripts/benchmark_pipeline.py --scale-factors SF1 SF10
+    python scripts/benchmark_pipeline.py --scale-factors SF1 --save-baseline
+"""
+from __future__ import annotations
+
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+from pathlib import Path
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+import duckdb
+
+from dbt_runner import DBT_PROJECT_DIR, dbt_command, model_timings, read_run_results
+from generate_data import Config
+from load_raw_to_duckdb import DELTA_DIR, MANIFEST_TABLE
+from pipeline_trace import children_peak_rss_mb
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+SCRIPTS_DIR = PROJECT_ROOT / "scripts"
+BENCH_DIR = PROJECT_ROOT / "benchmarks"
+
+SCALE_FACTORS = {"SF1": 1, "SF10": 10, "SF100": 100}
+RSS_MARKER = "__benchmark_peak_rss_mb__="
+# Wrapper process for run_stage. Kept to the standard library plus pipeline_trace:
+# a forked child's ru_maxrss starts from its parent's RSS, so a heavy wrapper
+# would inflate every stage's figure.
+MEASURE_CHILD = (
+    "import subprocess, sys; sys.path.insert(0, sys.argv[1]); "
+    "from pipeline_trace import children_peak_rss_mb; "
+    "code = subprocess.run(sys.argv[2:]).returncode; "
+    f"print(f'{RSS_MARKER}{{children_peak_rss_mb()}}', flush=True); "
+    "sys.exit(code)"
+)
+AUDIT_VIEWS = ["audit_star_schema", "audit_retention_by_risk"]
+EXPORT_TABLES = [
+    "fact_enrolment_year",
+    "fact_retention_outcome",
+    "fact_student_success_score",
+    "dim_student",
+    "dim_programme",
+    "dim_academic_year",
+]
+
+
+def run_stage(argv: list[str], cwd: Path = PROJECT_ROOT) -> tuple[float, float | None, str]:
+    """
+    Runs one stage as a child process. Returns (wall seconds, peak RSS MB, stdout).
+
+    RUSAGE_CHILDREN only keeps the high-water mark across every child waited for,
+    so the stage runs under a fresh MEASURE_CHILD process whose only child is the
+    stage. Peak RSS is None where getrusage is unavailable (Windows).
+    """
+    command = [str(a) for a in argv]
+    measured = children_peak_rss_mb() is not None
+    if measured:
+        command = [sys.executable, "-c", MEASURE_CHILD, str(SCRIPTS_DIR), *command]
+
+    start = time.perf_counter()
+    proc = subprocess.run(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    elapsed = time.perf_counter() - start
+
+    stdout, rss = proc.stdout, None
+    if measured:
+        stdout, _, marker = stdout.rstrip("\n").rpartition("\n")
+        if marker.startswith(RSS_MARKER):
+            rss = float(marker[len(RSS_MARKER):])
+        else:
+            stdout = proc.stdout
+    if proc.returncode != 0:
+        raise RuntimeError(f"Stage failed ({proc.returncode}): {' '.join(map(str, argv))}\n{stdout}")
+    return elapsed, rss, stdout
+
+
+def count_rows(db_path: Path, relations: list[str]) -> int:
+    con = duckdb.connect(str(db_path), read_only=True)
+    try:
+        return sum(con.execute(f"select count(*) from {r}").fetchone()[0] for r in relations)
+    finally:
+        con.close()
+
+
+def count_change_rows(db_path: Path) -> int:
+    """Rows of the change files (generate_data --delta) recorded in the loader manifest."""
+    con = duckdb.connect(str(db_path), read_only=True)
+    try:
+        return con.execute(
+            f"select coalesce(sum(row_count), 0) from {MANIFEST_TABLE} where file_path like '%/{DELTA_DIR}/%'"
+        ).fetchone()[0]
+    finally:
+        con.close()
+
+
+def stage_record(stage: str, seconds: float, rows: int, peak_rss_mb: float | None) -> dict:
+    return {
+        "stage": stage,
+        "seconds": round(seconds, 4),
+        "peak_rss_mb": None if peak_rss_mb is None else round(peak_rss_mb, 1),
+        "rows": rows,
+        "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None,
+    }
+
+
+def run_audits(db_path: Path) -> None:
+    """Child-process entry point: queries each audit view and prints JSON timings."""
+    con = duckdb.connect(str(db_path), read_only=True)
+    timings = {}
+    for view in AUDIT_VIEWS:
+        start = time.perf_counter()
+        con.execute(f"select * from main.{view}").fetchall()
+        timings[view] = time.perf_counter() - start
+    con.close()
+    print(json.dumps(timings))
+
+
+def benchmark_scale_factor(name: str, work_dir: Path, args: argparse.Namespace) -> list[dict]:
+    sf = SCALE_FACTORS[name]
+    sf_dir = work_dir / name.lower()
+    shutil.rmtree(sf_dir, ignore_errors=True)
+    raw_dir, db_path, export_dir = sf_dir / "raw", sf_dir / "warehouse.duckdb", sf_dir / "exports"
+    results = []
+
+    print(f"\n=== {name}: {Config.new_entrants_per_year * sf:,} entrants/year ===")
+
+    # 1) Generation
+    gen_argv = [
+        sys.executable, SCRIPTS_DIR / "generate_data.py",
+        "--engine", "vectorized",
+        "--new-entrants-per-year", Config.new_entrants_per_year * sf,
+        "--output-dir", raw_dir,
+        "--output-format", args.output_format,
+    ]
+    if args.workers:
+        gen_argv += ["--workers", args.workers]
+    seconds, rss, _ = run_stage(gen_argv)
+
+    # 2) Raw load (generated row counts are taken from the loaded raw tables)
+    load_seconds, load_rss, _ = run_stage(
+        [sys.executable, SCRIPTS_DIR / "load_raw_to_duckdb.py", "--full-refresh", "--raw-dir", raw_dir, "--db-path", db_path]
+    )
+    raw_rows = count_rows(db_path, ["raw.students", "raw.programmes", "raw.enrolments", "raw.academic_performance"])
+    results.append(stage_record("generate", seconds, raw_rows, rss))
+    results.append(stage_record("load", load_seconds, raw_rows, load_rss))
+
+    # 3) dbt, one record per model from run_results.json plus the whole invocation
+    dbt_dir = sf_dir / "dbt"
+    seconds, rss, _ = run_stage(dbt_command(["run", "--full-refresh"], db_path, dbt_dir), cwd=DBT_PROJECT_DIR)
+    # Models only; the on-run-start/end hooks have results too
+    timings = [t for t in model_timings(read_run_results(dbt_dir)) if t["unique_id"].startswith("model.")]
+    model_rows = 0
+    for t in timings:
+        n = count_rows(db_path, [f"main.{t['name']}"])
+        model_rows += n
+        results.append(stage_record(f"dbt:{t['name']}", t["seconds"], n, None))
+    results.append(stage_record("dbt", seconds, model_rows, rss))
+
+    # 4) Audits, queried in a child process so RSS is attributable
+    seconds, rss, stdout = run_stage([sys.executable, Path(__file__), "--run-audits", db_path])
+    fact_rows = count_rows(db_path, ["main.fact_enrolment_year"])
+    for view, view_seconds in json.loads(stdout.strip().splitlines()[-1]).items():
+        results.append(stage_record(f"audit:{view}", view_seconds, fact_rows, None))
+    results.append(stage_record("audits", seconds, fact_rows, rss))
+
+    # 5) Export
+    seconds, rss, _ = run_stage(
+        [
+            sys.executable, SCRIPTS_DIR / "export_for_tableau.py",
+            "--format", args.export_format, "--db-path", db_path, "--export-dir", export_dir,
+        ]
+    )
+    results.append(stage_record("export", seconds, count_rows(db_path, [f"main.{t}" for t in EXPORT_TABLES]), rss))
+
+    # 6) Steady-state refresh: the next academic year as change files, applied by the
+    # incremental loader and incremental dbt run on top of the warehouse built above
+    seconds, rss, _ = run_stage(gen_argv + ["--delta"])
+    load_seconds, load_rss, _ = run_stage(
+        [sys.executable, SCRIPTS_DIR / "load_raw_to_duckdb.py", "--raw-dir", raw_dir, "--db-path", db_path]
+    )
+    delta_rows = count_change_rows(db_path)
+    results.append(stage_record("delta:generate", seconds, delta_rows, rss))
+    results.append(stage_record("delta:load", load_seconds, delta_rows, load_rss))
+    seconds, rss, _ = run_stage(dbt_command(["run"], db_path, dbt_dir), cwd=DBT_PROJECT_DIR)
+    results.append(stage_record("delta:dbt", seconds, delta_rows, rss))
+
+    for r in results:
+        rss_text = "" if r["peak_rss_mb"] is None else f"{r['peak_rss_mb']:>9,.0f} MB"
+        print(f"{r['stage']:<42}{r['seconds']:>9.3f}s{rss_text:>13}{r['rows_per_sec'] or 0:>15,.0f} rows/s")
+
+    if not args.keep_data:
+        shutil.rmtree(sf_dir, ignore_errors=True)
+    return results
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float, min_seconds: float) -> list[str]:
+    """Stages whose wall time grew by more than `tolerance` over the baseline."""
+    regressions = []
+    for sf, stages in results["scale_factors"].items():
+        base_stages = {s["stage"]: s for s in baseline.get("scale_factors", {}).get(sf, [])}
+        for s in stages:
+            base = base_stages.get(s["stage"])
+            # Ignore sub-noise stages where a few ms swing would look like a large ratio
+            if base is None or base["seconds"] < min_seconds:
+                continue
+            ratio = s["seconds"] / base["seconds"]
+            if ratio > 1 + tolerance:
+                regressions.append(f"{sf} {s['stage']}: {base['seconds']:.3f}s -> {s['seconds']:.3f}s ({ratio:.2f}x)")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale-factors", nargs="+", choices=list(SCALE_FACTORS), default=["SF1", "SF10"])
+    parser.add_argument("--work-dir", type=Path, default=BENCH_DIR / "work")
+    parser.add_argument("--results", type=Path, default=BENCH_DIR / "results.json")
+    parser.add_argument("--baseline", type=Path, default=BENCH_DIR / "baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="allowed slowdown before flagging (0.20 = 20%%)")
+    parser.add_argument("--min-seconds", type=float, default=0.25, help="ignore stages faster than this in the baseline")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--output-format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--export-format", choices=["parquet", "csv", "xlsx"], default="parquet")
+    parser.add_argument("--workers", type=int, default=0, help="passed to generate_data --workers")
+    parser.add_argument("--keep-data", action="store_true", help="keep generated data and warehouses")
+    parser.add_argument("--run-audits", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_audits:
+        run_audits(args.run_audits)
+        return
+
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "scale_factors": {name: benchmark_scale_factor(name, args.work_dir, args) for name in args.scale_factors},
+    }
+
+    args.results.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.results, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.results}")
+
+    if args.save_baseline:
+        shutil.copyfile(args.results, args.baseline)
+        print(f"Baseline updated: {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return
+
+    with open(args.baseline) as f:
+        regressions = compare_to_baseline(results, json.load(f), args.tolerance, args.min_seconds)
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} stage(s) slower than baseline by more than {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        if args.fail_on_regression:
+            sys.exit(1)
+    else:
+        print("\n✅ No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Benchmarks the fact_retention_outcome formulations at several data volumes.
+
+  legacy      correlated EXISTS look-ups against two DISTINCT CTEs (original model)
+  single_pass one equi-join against next-year presence keyed to year_index - 1 (current model)
+
+For each scale factor a synthetic fact_enrolment_year is generated with the
+vectorized engine (1x = the default 2,400 entrants/year). Each query runs in
+its own process so peak RSS is attributable to it (not reported on Windows).
+
+    python scripts/benchmark_retention_outcome.py --scale-factors 1 10 100
+"""
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+import tempfile
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from generate_data import (
+    Config,
+    generate_programmes,
+    generate_students,
+    set_seeds,
+    simulate_enrolments_and_performance_vectorized,
+)
+from pipeline_trace import peak_rss_mb
+
+# Plain-SQL equivalents of the dbt model, reading fact_enrolment_year / dim_academic_year
+QUERIES = {
+    "legacy": """
+        with base as (
+            select student_id, programme_id, academic_year, year_of_study
+            from fact_enrolment_year
+        ),
+        year_map as (
+            select academic_year as year_n, lead(academic_year) over (order by year_index) as year_n1
+            from dim_academic_year
+        ),
+        n as (
+            select b.*, ym.year_n1 as next_academic_year
+            from base b left join year_map ym on b.academic_year = ym.year_n
+        ),
+        next_year_any as (select distinct student_id, academic_year from base),
+        next_year_same_prog as (select distinct student_id, programme_id, academic_year from base)
+        select
+            n.student_id, n.programme_id, n.academic_year,
+            case
+                when n.next_academic_year is null then null
+                when exists (
+                    select 1 from next_year_any a
+                    where a.student_id = n.student_id and a.academic_year = n.next_academic_year
+                ) then 1 else 0
+            end as retained_institution_next_year_flag,
+            case
+                when n.next_academic_year is null then null
+                when exists (
+                    select 1 from next_year_same_prog sp
+                    where sp.student_id = n.student_id and sp.programme_id = n.programme_id
+                      and sp.academic_year = n.next_academic_year
+                ) then 1 else 0
+            end as retained_same_programme_next_year_flag
+        from n
+    """,
+    "single_pass": """
+        with base as (
+            select student_id, programme_id, academic_year, year_of_study
+            from fact_enrolment_year
+        ),
+        year_map as (
+            select academic_year, year_index, lead(year_index) over (order by year_index) as next_year_index
+            from dim_academic_year
+        ),
+        n as (
+            select b.*, ym.year_index, ym.next_year_index
+            from base b left join year_map ym on b.academic_year = ym.academic_year
+        ),
+        next_year_presence as (
+            select student_id, year_index - 1 as year_index, list(distinct programme_id) as next_year_programmes
+            from n
+            group by student_id, year_index
+        )
+        select
+            n.student_id, n.programme_id, n.academic_year,
+            case
+                when n.next_year_index is null then null
+                when nx.student_id is not null then 1 else 0
+            end as retained_institution_next_year_flag,
+            case
+                when n.next_year_index is null then null
+                when list_contains(nx.next_year_programmes, n.programme_id) then 1 else 0
+            end as retained_same_programme_next_year_flag
+        from n
+        left join next_year_presence nx
+            on n.student_id = nx.student_id and n.year_index = nx.year_index
+    """,
+}
+
+
+def build_fact_extract(scale_factor: int, path: Path) -> int:
+    """Writes a synthetic fact_enrolment_year (registered, de-duplicated) to Parquet."""
+    cfg = replace(Config(), new_entrants_per_year=Config.new_entrants_per_year * scale_factor)
+    set_seeds(cfg.seed)
+    programmes = generate_programmes(cfg)
+    students = generate_students(cfg, total_students=cfg.new_entrants_per_year * len(cfg.academic_years))
+    enrolments, _ = simulate_enrolments_and_performance_vectorized(cfg, students, programmes)
+
+    fact = (
+        enrolments[enrolments["registration_status"] == "Registered"]
+        .drop_duplicates(["student_id", "programme_id", "academic_year"])
+        [["student_id", "programme_id", "academic_year", "year_of_study"]]
+    )
+    con = duckdb.connect()
+    con.register("fact_df", fact)
+    con.execute(f"copy fact_df to '{path.as_posix()}' (format parquet)")
+    con.close()
+    return len(fact)
+
+
+def run_query(variant: str, fact_path: str) -> dict:
+    """Runs one formulation in a fresh process; returns timing and peak RSS growth."""
+    con = duckdb.connect()
+    con.execute(f"create table fact_enrolment_year as select * from read_parquet('{fact_path}')")
+    con.execute(
+        """
+        create table dim_academic_year as
+        select academic_year, dense_rank() over (order by academic_year) as year_index
+        from (select distinct academic_year from fact_enrolment_year)
+        """
+    )
+    rss_before = peak_rss_mb()
+
+    start = time.perf_counter()
+    checksum = con.execute(
+        f"""
+        select count(*), sum(retained_institution_next_year_flag), sum(retained_same_programme_next_year_flag)
+        from ({QUERIES[variant]})
+        """
+    ).fetchone()
+    elapsed = time.perf_counter() - start
+
+    con.close()
+    rss_after = peak_rss_mb()
+    return {
+        "variant": variant,
+        "seconds": elapsed,
+        "peak_rss_delta_mb": None if rss_after is None else rss_after - rss_before,
+        "checksum": checksum,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale-factors", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for sf in args.scale_factors:
+            fact_path = Path(tmp) / f"fact_enrolment_year_sf{sf}.parquet"
+            n_rows = build_fact_extract(sf, fact_path)
+            print(f"SF{sf}: {n_rows:,} fact_enrolment_year rows")
+
+            for variant in QUERIES:
+                runs = []
+                for _ in range(args.repeats):
+                    with ProcessPoolExecutor(max_workers=1) as pool:
+                        runs.append(pool.submit(run_query, variant, fact_path.as_posix()).result())
+                results.append(
+                    {
+                        "scale_factor": sf,
+                        "rows": n_rows,
+                        "variant": variant,
+                        "median_seconds": float(np.median([r["seconds"] for r in runs])),
+                        "peak_rss_delta_mb": max(
+                            (r["peak_rss_delta_mb"] for r in runs if r["peak_rss_delta_mb"] is not None),
+                            default=None,
+                        ),
+                        "checksum": runs[0]["checksum"],
+                    }
+                )
+
+    df = pd.DataFrame(results)
+    df["rows_per_sec"] = df["rows"] / df["median_seconds"]
+
+    # Both formulations must agree before their timings mean anything
+    mismatched = df.groupby("scale_factor")["checksum"].nunique() > 1
+    if mismatched.any():
+        raise SystemExit(f"Formulations disagree at SF {mismatched[mismatched].index.tolist()}")
+
+    print("\n=== fact_retention_outcome benchmark ===")
+    with pd.option_context("display.float_format", "{:,.3f}".format, "display.width", 120):
+        print(df.drop(columns="checksum").to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Blue/green warehouse builds: readers never see a half-built database.
+
+Readers keep opening duckdb/warehouse.duckdb, which becomes a symlink to one
+release. A build copies the live release (with its WAL) and the raw extracts
+(run_pipeline's --raw-dir, data/raw by default) into a staging directory, runs
+the pipeline there (load + dbt, incremental as usual, exports skipped), and
+gates it on the star schema audit. Only then is it renamed into a release and
+the symlink swapped with a single rename(2):
+
+    duckdb/warehouse.duckdb -> releases/20261016T020000/warehouse.duckdb
+    duckdb/releases/20261015T020000/warehouse.duckdb     previous, kept for rollback
+    duckdb/releases/20261015T020000/raw/                 the extracts it was built from
+    duckdb/releases/.building-<version>/                 in progress (left behind if the gate fails)
+
+The generate stage, if it runs, writes into the staged copy, so a build never
+changes the extracts behind the live release, and a rollback returns to a
+warehouse and raw directory that belong together. The shared raw directory is
+only read.
+
+Every release file keeps the name warehouse.duckdb. DuckDB follows the
+symlink and names the catalog after the real file, and the dbt views are
+qualified with that catalog. Readers that already have the old release open
+keep reading it. New connections get the new one.
+
+    python scripts/blue_green.py build --keep 3 -- --engine vectorized --export-format parquet
+    python scripts/blue_green.py list
+    python scripts/blue_green.py rollback [--to 20261015T020000]
+
+Exports (export_for_tableau.py) read the live path, so run them after a build.
+"""
+from __future__ import annotations
+
+import argparse
+from datetime import datetime
+import os
+from pathlib import Path
+import shutil
+import subprocess
+import sys
+
+import duckdb
+
+from load_raw_to_duckdb import DB_PATH, MANIFEST_TABLE
+from pipeline_trace import span
+import run_pipeline
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+BUILDING_PREFIX = ".building-"
+RAW_SUBDIR = "raw"   # each release's copy of the extracts it was built from
+
+
+def releases_dir(live: Path) -> Path:
+    return live.parent / "releases"
+
+
+def list_releases(live: Path) -> list[Path]:
+    """Completed release directories, oldest first (versions sort by time)."""
+    root = releases_dir(live)
+    if not root.exists():
+        return []
+    return sorted(p for p in root.iterdir() if p.is_dir() and not p.name.startswith("."))
+
+
+def live_release(live: Path) -> Path | None:
+    return live.resolve().parent if live.is_symlink() else None
+
+
+def swap(live: Path, release: Path) -> None:
+    """Atomically points the live path at release (a new symlink renamed over the old one)."""
+    tmp = live.with_name(live.name + ".swap")
+    tmp.unlink(missing_ok=True)
+    tmp.symlink_to(os.path.relpath(release / live.name, live.parent))
+    os.replace(tmp, live)
+
+
+def adopt(live: Path) -> None:
+    """Turns a plain warehouse file into the first release, so builds can copy it."""
+    if live.is_symlink() or not live.exists():
+        return
+    version = datetime.fromtimestamp(live.stat().st_mtime).strftime("%Y%m%dT%H%M%S")
+    release = releases_dir(live) / version
+    release.mkdir(parents=True)
+    for path in (live, live.with_name(live.name + ".wal")):
+        if path.exists():
+            path.rename(release / path.name)
+    swap(live, release)
+    print(f"Adopted {live} as release {version}")
+
+
+def copy_database(source: Path, target: Path) -> None:
+    """
+    Copies a DuckDB file together with its WAL, so writes that were never
+    checkpointed into the file come along. Nothing writes to a live release, so
+    the two copies are consistent.
+    """
+    shutil.copy2(source, target)
+    wal = source.with_name(source.name + ".wal")
+    if wal.exists():
+        shutil.copy2(wal, target.with_name(target.name + ".wal"))
+
+
+def rebase_manifest(db_path: Path, old_raw: Path, new_raw: Path) -> None:
+    """
+    Points the loader manifest's file paths from old_raw at new_raw, so a copied
+    raw directory with unchanged files still loads as unchanged (copies keep
+    size and mtime).
+    """
+    old_prefix, new_prefix = old_raw.as_posix().rstrip("/") + "/", new_raw.as_posix().rstrip("/") + "/"
+    con = duckdb.connect(str(db_path))
+    try:
+        has_manifest = con.execute(
+            "select count(*) from information_schema.tables where table_schema = 'raw' and table_name = ?",
+            [MANIFEST_TABLE.split(".", 1)[1]],
+        ).fetchone()[0]
+        if has_manifest:
+            con.execute(
+                f"update {MANIFEST_TABLE} set file_path = ? || file_path[length(?) + 1:] where starts_with(file_path, ?)",
+                [new_prefix, old_prefix, old_prefix],
+            )
+    finally:
+        con.close()
+
+
+def prune(live: Path, keep: int) -> list[Path]:
+    """Deletes all but the `keep` newest releases (never the live one)."""
+    current = live_release(live)
+    removed = [r for r in list_releases(live)[:-keep] if r != current]
+    for release in removed:
+        shutil.rmtree(release)
+    return removed
+
+
+def build(live: Path, pipeline_argv: list[str], keep: int = 3) -> Path:
+    """
+    Builds, audits and publishes a new release. A failing stage or audit raises
+    before the swap, leaving readers on the current release and the staging
+    directory in place for inspection.
+    """
+    pipeline_args = run_pipeline.parse_args(pipeline_argv)
+    adopt(live)
+    current = live_release(live)
+    version = datetime.now().strftime("%Y%m%dT%H%M%S")
+    staging_dir = releases_dir(live) / f"{BUILDING_PREFIX}{version}"
+    staging_dir.mkdir(parents=True)
+    staging = staging_dir / live.name
+    staged_raw = (staging_dir / RAW_SUBDIR).resolve()
+
+    with span("blue_green.build", version=version):
+        with span("blue_green.copy") as s:
+            # The build's own copy of the extracts: generate may rewrite it, the
+            # shared raw directory and the live release's copy stay as they are
+            if pipeline_args.raw_dir.exists():
+                shutil.copytree(pipeline_args.raw_dir, staged_raw)
+            # Starting from a copy keeps the loader manifest and incremental facts, so
+            # only new data is processed; readers only hold shared locks, so this is safe
+            if live.exists():
+                copy_database(live.resolve(), staging)
+                # The live manifest points at the live release's raw copy, or at the
+                # shared raw directory for a release adopted from a plain file
+                live_raw = current / RAW_SUBDIR if current and (current / RAW_SUBDIR).exists() else pipeline_args.raw_dir
+                rebase_manifest(staging, live_raw, staged_raw)
+                s.set(bytes=staging.stat().st_size)
+
+        # In a child process: in-process dbt keeps its DuckDB instance (and the
+        # write lock) alive, and readers must be able to open the file once it is live
+        subprocess.run(
+            [
+                sys.executable, SCRIPTS_DIR / "run_pipeline.py", *pipeline_argv,
+                "--db-path", staging, "--raw-dir", staged_raw, "--no-export",
+                "--force", *pipeline_args.force, "audit",   # the gate always runs
+            ],
+            check=True,
+        )
+
+    release = releases_dir(live) / version
+    staging_dir.rename(release)
+    rebase_manifest(release / live.name, staged_raw, (release / RAW_SUBDIR).resolve())
+    with span("blue_green.swap", version=version):
+        swap(live, release)
+    print(f"\n✅ {live} -> release {version}")
+
+    for old in prune(live, keep):
+        print(f"Removed release {old.name}")
+    return release
+
+
+def rollback(live: Path, to: str | None = None) -> Path:
+    """Points the live path at release `to`, or at the release before the current one."""
+    releases = list_releases(live)
+    current = live_release(live)
+    if to is not None:
+        target = releases_dir(live) / to
+        if target not in releases:
+            raise SystemExit(f"No release {to}; have {[r.name for r in releases]}")
+    else:
+        older = [r for r in releases if current is None or r.name < current.name]
+        if not older:
+            raise SystemExit("No earlier release to roll back to")
+        target = older[-1]
+    swap(live, target)
+    print(f"{live} -> release {target.name} (was {current.name if current else 'none'})")
+    return target
+
+
+def print_releases(live: Path) -> None:
+    current = live_release(live)
+    for release in list_releases(live):
+        size = (release / live.name).stat().st_size
+        print(f"{'*' if release == current else ' '} {release.name}  {size / 1e6:>10,.1f} MB")
+    for staging in releases_dir(live).glob(f"{BUILDING_PREFIX}*"):
+        print(f"  {staging.name}  (incomplete or failed build)")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", type=Path, default=DB_PATH, help="path readers open")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="build, audit and publish a new release")
+    b.add_argument("--keep", type=int, default=3, help="releases kept for rollback, including the new one")
+    b.add_argument("pipeline_args", nargs=argparse.REMAINDER, help="run_pipeline.py arguments, after --")
+    r = sub.add_parser("rollback", help="point the live path at an earlier release")
+    r.add_argument("--to", default=None, help="release version (default: the one before the live release)")
+    sub.add_parser("list", help="show releases; * marks the live one")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        pipeline_argv = [a for a in args.pipeline_args if a != "--"]
+        try:
+            build(args.live, pipeline_argv, keep=max(1, args.keep))
+        except subprocess.CalledProcessError:
+            current = live_release(args.live)
+            raise SystemExit(
+                f"\n❌ Build failed; {args.live} still points at release {current.name if current else 'none'}"
+            )
+    elif args.command == "rollback":
+        rollback(args.live, args.to)
+    else:
+        print_releases(args.live)
+
+
+if __name__ == "__main__":
+    main()
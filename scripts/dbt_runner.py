@@ -0,0 +1,86 @@
+"""
+Runs the tus_mini_bi dbt project against an arbitrary DuckDB file.
+
+dbt normally reads ~/.dbt/profiles.yml; scripts that build throwaway or staging
+warehouses generate a one-off profile pointing at their own database instead.
+"""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+import subprocess
+
+import yaml
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+DBT_PROJECT_DIR = PROJECT_ROOT / "dbt" / "tus_mini_bi"
+PROFILE_NAME = "tus_mini_bi"
+
+
+def write_profiles(profiles_dir: Path, db_path: Path, threads: int = 4) -> Path:
+    """Writes a profiles.yml whose only target points at db_path."""
+    profiles_dir.mkdir(parents=True, exist_ok=True)
+    profile = {
+        PROFILE_NAME: {
+            "target": "local",
+            "outputs": {
+                "local": {"type": "duckdb", "path": str(db_path), "threads": threads},
+            },
+        }
+    }
+    path = profiles_dir / "profiles.yml"
+    with open(path, "w") as f:
+        yaml.safe_dump(profile, f, sort_keys=False)
+    return path
+
+
+def dbt_command(args: list[str], db_path: Path, work_dir: Path, threads: int = 4) -> list[str]:
+    """
+    Full dbt argv for `args` (e.g. ["run", "--select", "facts"]) against db_path.
+    Profiles, compiled SQL, run_results.json and logs all live under work_dir.
+    """
+    write_profiles(work_dir / "profiles", db_path, threads=threads)
+    return [
+        "dbt", *args,
+        "--project-dir", str(DBT_PROJECT_DIR),
+        "--profiles-dir", str(work_dir / "profiles"),
+        "--target-path", str(work_dir / "target"),
+        "--log-path", str(work_dir / "logs"),
+    ]
+
+
+def read_run_results(work_dir: Path) -> dict:
+    with open(work_dir / "target" / "run_results.json") as f:
+        return json.load(f)
+
+
+def model_timings(run_results: dict) -> list[dict]:
+    """Per-node name, status and execution seconds from a run_results.json payload."""
+    return [
+        {
+            "name": r["unique_id"].split(".")[-1],
+            "unique_id": r["unique_id"],
+            "status": r["status"],
+            "seconds": r["execution_time"],
+        }
+        for r in run_results["results"]
+    ]
+
+
+def run_dbt(args: list[str], db_path: Path, work_dir: Path, threads: int = 4) -> dict:
+    """Runs dbt to completion (raising on failure) and returns its run_results.json."""
+    subprocess.run(dbt_command(args, db_path, work_dir, threads=threads), check=True, cwd=DBT_PROJECT_DIR)
+    return read_run_results(work_dir)
+
+
+def invoke_dbt(args: list[str], db_path: Path, work_dir: Path, threads: int = 4) -> dict:
+    """
+    Same as run_dbt but in this process via dbtRunner, so dbt shares the DuckDB
+    database instance of any connection the caller already holds on db_path.
+    """
+    from dbt.cli.main import dbtRunner
+
+    result = dbtRunner().invoke(dbt_command(args, db_path, work_dir, threads=threads)[1:])
+    if not result.success:
+        raise RuntimeError(f"dbt {' '.join(args)} failed: {result.exception or 'see dbt log output'}")
+    return read_run_results(work_dir)
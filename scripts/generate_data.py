@@ -1,11 +1,19 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+import json
 from pathlib import Path
 import random
+import shutil
+
+import duckdb
 import numpy as np
 import pandas as pd
 
+from pipeline_trace import span
+
 # -----------------------------
 # Config
 # -----------------------------
@@ -21,6 +29,21 @@ class Config:
     repeat_rate_if_low_gpa: float = 0.15
     missing_perf_rate: float = 0.015
     duplicate_enrolment_rate: float = 0.005
+    # "loop" = original per-student simulator, "vectorized" = batched numpy engine
+    engine: str = "loop"
+    # "csv" = single file per extract, "parquet" = academic_year-partitioned directories
+    output_format: str = "csv"
+    # Flush each academic year to disk as soon as it is simulated (vectorized engine only)
+    stream: bool = False
+    # >0 = shard students into fixed-size blocks simulated on a process pool of this size
+    workers: int = 0
+    shard_size: int = 50_000
+    # Emit the next academic year as change files instead of a full snapshot
+    delta: bool = False
+    correction_rate: float = 0.02    # previous-year performance rows revised late
+    withdrawal_rate: float = 0.02    # new-year enrolments withdrawn after registering
+    # A snapshot run refuses to overwrite an output dir holding change files unless set
+    drop_deltas: bool = False
 
 
 def set_seeds(seed: int) -> None:
@@ -109,6 +132,14 @@ def generate_programmes(cfg: Config) -> pd.DataFrame:
     return programmes_df
 
 
+# Raw-ish variants a clean gender value can be recorded as
+GENDER_NOISE = {
+    "Male": ["male", "M", "MALE"],
+    "Female": ["female", "F", "FEMALE"],
+    "Other/Unknown": ["Unknown", "Other", "Not Stated"],
+}
+
+
 def generate_students(cfg: Config, total_students: int) -> pd.DataFrame:
     campuses = ["Athlone", "Moylish", "Thurles", "Clonmel", "Ennis"]
 
@@ -147,10 +178,7 @@ def generate_students(cfg: Config, total_students: int) -> pd.DataFrame:
     dob_months = np.random.randint(1, 13, size=total_students)
     dob_days = np.random.randint(1, 29, size=total_students)  # avoid month-length issues
 
-    date_of_birth = [
-        f"{int(y):04d}-{int(m):02d}-{int(d):02d}"
-        for y, m, d in zip(dob_years, dob_months, dob_days)
-    ]
+    date_of_birth = _iso_dates(dob_years, dob_months, dob_days)
 
     # Gender (raw-ish): generate clean then introduce noise
     # Base distribution: 48/48/4
@@ -160,23 +188,21 @@ def generate_students(cfg: Config, total_students: int) -> pd.DataFrame:
         p=[0.48, 0.48, 0.04],
     )
 
-    # Introduce raw category noise for gender (small %)
+    # Introduce raw category noise for gender (small %): one of three spellings per
+    # noisy row, drawn in noise_idx order (the same draws as one choice per row)
     gender = base_gender.astype(object).copy()
     noise_idx = np.random.choice(np.arange(total_students), size=int(total_students * 0.06), replace=False)
-    for i in noise_idx:
-        if gender[i] == "Male":
-            gender[i] = np.random.choice(["male", "M", "MALE"])
-        elif gender[i] == "Female":
-            gender[i] = np.random.choice(["female", "F", "FEMALE"])
-        else:
-            gender[i] = np.random.choice(["Unknown", "Other", "Not Stated"])
+    variant = np.random.randint(0, 3, size=len(noise_idx))
+    noisy_base = base_gender[noise_idx]
+    for value, variants in GENDER_NOISE.items():
+        mask = noisy_base == value
+        gender[noise_idx[mask]] = np.array(variants, dtype=object)[variant[mask]]
 
     # Entry route, with slight imperfection noise
     entry_route = np.random.choice(entry_routes, size=total_students, p=entry_probs).astype(object)
     # A tiny amount of casing inconsistency
     route_noise_idx = np.random.choice(np.arange(total_students), size=int(total_students * 0.02), replace=False)
-    for i in route_noise_idx:
-        entry_route[i] = str(entry_route[i]).lower()
+    entry_route[route_noise_idx] = _lower(entry_route[route_noise_idx])
 
     # Access flag
     access_flag = np.random.choice([0, 1], size=total_students, p=[1 - access_prob, access_prob])
@@ -189,7 +215,7 @@ def generate_students(cfg: Config, total_students: int) -> pd.DataFrame:
 
     # Create pseudonymised student ids
     # e.g., STU000001 ... STU012000
-    student_ids = [f"STU{str(i+1).zfill(6)}" for i in range(total_students)]
+    student_ids = _student_ids(total_students)
 
     students_df = pd.DataFrame(
         {
@@ -214,6 +240,107 @@ def generate_students(cfg: Config, total_students: int) -> pd.DataFrame:
     return students_df
 
 
+def _iso_dates(years: np.ndarray, months: np.ndarray, days: np.ndarray) -> np.ndarray:
+    """YYYY-MM-DD strings via datetime64 arithmetic (days are kept <= 28 by the callers)."""
+    dates = (np.asarray(years) - 1970).astype("datetime64[Y]").astype("datetime64[M]")
+    dates = dates + (np.asarray(months) - 1).astype("timedelta64[M]")
+    dates = dates.astype("datetime64[D]") + (np.asarray(days) - 1).astype("timedelta64[D]")
+    return dates.astype(str).astype(object)
+
+
+def _lower(values: np.ndarray) -> np.ndarray:
+    return pd.Series(values, dtype=object).astype(str).str.lower().to_numpy(dtype=object)
+
+
+def _student_ids(n: int, start: int = 1) -> np.ndarray:
+    return ("STU" + pd.Series(np.arange(start, start + n)).astype(str).str.zfill(6)).to_numpy(dtype=object)
+
+
+def student_rng(cfg: Config) -> np.random.Generator:
+    # Own entropy so the dimension stream never overlaps the simulation's default_rng(seed)
+    return np.random.default_rng([cfg.seed, 0x5354])
+
+
+def generate_students_vectorized(cfg: Config, total_students: int, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Same distributions and raw-ish noise as generate_students, drawn in batches
+    from rng: mask-based noise, datetime64 DOBs and bulk missingness. Used by the
+    vectorized engine; the loop engine keeps generate_students so the committed
+    extracts stay reproducible.
+    """
+    n = total_students
+
+    # Age at the 2020 baseline: 85% typical UG (18-24), 15% mature (25-55)
+    is_mature = rng.random(n) < 0.15
+    ages = np.where(is_mature, rng.integers(25, 56, size=n), rng.integers(18, 25, size=n))
+    date_of_birth = _iso_dates(2020 - ages, rng.integers(1, 13, size=n), rng.integers(1, 29, size=n))
+
+    gender = rng.choice(["Male", "Female", "Other/Unknown"], size=n, p=[0.48, 0.48, 0.04]).astype(object)
+    noise_pos = rng.choice(n, size=int(n * 0.06), replace=False)
+    variant = rng.integers(0, 3, size=len(noise_pos))
+    clean = gender[noise_pos]
+    for value, variants in GENDER_NOISE.items():
+        hit = clean == value
+        gender[noise_pos[hit]] = np.array(variants, dtype=object)[variant[hit]]
+
+    entry_route = rng.choice(
+        ["CAO", "QQI/FET", "Mature", "International", "Other"], size=n, p=[0.65, 0.15, 0.10, 0.07, 0.03]
+    ).astype(object)
+    route_noise_pos = rng.choice(n, size=int(n * 0.02), replace=False)
+    entry_route[route_noise_pos] = _lower(entry_route[route_noise_pos])
+
+    # 1% missing entry_route and gender (same counts as DataFrame.sample(frac=0.01))
+    entry_route[rng.choice(n, size=round(n * 0.01), replace=False)] = None
+    gender[rng.choice(n, size=round(n * 0.01), replace=False)] = None
+
+    return pd.DataFrame(
+        {
+            "student_id": _student_ids(n),
+            "gender": gender,
+            "date_of_birth": date_of_birth,
+            "entry_route": entry_route,
+            "access_flag": (rng.random(n) < 0.18).astype(np.int64),
+            "nationality_group": rng.choice(["Irish", "EU", "Non-EU"], size=n, p=[0.82, 0.10, 0.08]),
+            "home_campus": rng.choice(["Athlone", "Moylish", "Thurles", "Clonmel", "Ennis"], size=n),
+        }
+    )
+
+
+@dataclass(frozen=True)
+class ProgrammeIndex:
+    """
+    Array-backed programme lookups, built once per simulation. Programmes are
+    integer-coded by their row position in programmes_df.
+    """
+    programme_ids: np.ndarray              # code -> programme_id
+    codes: dict[str, int]                  # programme_id -> code
+    difficulty: np.ndarray                 # code -> difficulty_factor
+    credits: np.ndarray                    # code -> credits attempted (60 FT, 30 PT)
+    faculty: np.ndarray                    # code -> faculty group
+    faculty_members: tuple[np.ndarray, ...]  # faculty group -> member codes, in programmes_df order
+
+    @classmethod
+    def from_frame(cls, programmes_df: pd.DataFrame) -> "ProgrammeIndex":
+        programme_ids = programmes_df["programme_id"].to_numpy()
+        # Faculty noise is case-only, so group on lower case
+        _, faculty = np.unique(programmes_df["faculty"].astype(str).str.lower().to_numpy(), return_inverse=True)
+        return cls(
+            programme_ids=programme_ids,
+            codes={pid: code for code, pid in enumerate(programme_ids)},
+            difficulty=programmes_df["difficulty_factor"].to_numpy(dtype=float),
+            credits=np.where(programmes_df["mode"].astype(str).to_numpy() == "FT", 60, 30),
+            faculty=faculty,
+            faculty_members=tuple(np.flatnonzero(faculty == f) for f in range(faculty.max() + 1)),
+        )
+
+    def __len__(self) -> int:
+        return len(self.programme_ids)
+
+    def same_faculty_ids(self, code: int) -> list[str]:
+        """Programme ids sharing code's faculty (including itself), in programmes_df order."""
+        return self.programme_ids[self.faculty_members[self.faculty[code]]].tolist()
+
+
 def simulate_enrolments_and_performance(
     cfg: Config,
     students_df: pd.DataFrame,
@@ -226,7 +353,7 @@ def simulate_enrolments_and_performance(
       academic_performance_raw: grain ~ student-academic_year
     """
     # Helper lookups
-    prog = programmes_df.set_index("programme_id")
+    prog = ProgrammeIndex.from_frame(programmes_df)
     programme_ids = programmes_df["programme_id"].tolist()
 
     # Track each student's "current" state across years
@@ -262,7 +389,7 @@ def simulate_enrolments_and_performance(
         """
         Generate a GPA and attendance rate influenced by programme difficulty and access flag.
         """
-        difficulty = float(prog.loc[programme_id, "difficulty_factor"])  # 0.60..0.90
+        difficulty = float(prog.difficulty[prog.codes[programme_id]])  # 0.60..0.90
         access = int(access_lookup.get(student_id, 0))
 
         # Base GPA centered ~2.85 with noise
@@ -285,7 +412,7 @@ def simulate_enrolments_and_performance(
         """
         Compute probability of being retained into next academic year.
         """
-        difficulty = float(prog.loc[programme_id, "difficulty_factor"])
+        difficulty = float(prog.difficulty[prog.codes[programme_id]])
         access = int(access_lookup.get(student_id, 0))
 
         p = 0.88
@@ -363,8 +490,7 @@ def simulate_enrolments_and_performance(
             )
 
             # Credits attempted based on mode
-            mode = str(prog.loc[programme_id, "mode"])
-            credits_attempted = 60 if mode == "FT" else 30
+            credits_attempted = int(prog.credits[prog.codes[programme_id]])
 
             enrolment_rows.append(
                 {
@@ -394,10 +520,9 @@ def simulate_enrolments_and_performance(
                     # Transfer (small %)
                     if np.random.rand() < cfg.transfer_rate:
                         # transfer within same faculty (more realistic)
-                        faculty = prog.loc[programme_id, "faculty"]
-                        same_faculty = programmes_df[programmes_df["faculty"].astype(str).str.lower() == str(faculty).lower()]
+                        same_faculty = prog.same_faculty_ids(prog.codes[programme_id])
                         if len(same_faculty) > 0:
-                            next_programme = random.choice(same_faculty["programme_id"].tolist())
+                            next_programme = random.choice(same_faculty)
 
                     # Repeat rule for low GPA
                     next_yos = yos + 1
@@ -417,12 +542,11 @@ def simulate_enrolments_and_performance(
         miss_n = int(len(performance_df) * cfg.missing_perf_rate)
         if miss_n > 0:
             miss_idx = performance_df.sample(n=miss_n, random_state=cfg.seed).index
-            # randomly choose whether GPA or attendance is missing
-            for idx in miss_idx:
-                if np.random.rand() < 0.5:
-                    performance_df.loc[idx, "gpa"] = None
-                else:
-                    performance_df.loc[idx, "attendance_rate"] = None
+            # randomly choose whether GPA or attendance is missing (one bulk draw, same
+            # stream as drawing per row) and blank them in two assignments
+            gpa_missing = np.random.rand(miss_n) < 0.5
+            performance_df.loc[miss_idx[gpa_missing], "gpa"] = np.nan
+            performance_df.loc[miss_idx[~gpa_missing], "attendance_rate"] = np.nan
 
     # 2) Duplicate enrolment rows (very small %)
     if cfg.duplicate_enrolment_rate > 0:
@@ -440,28 +564,887 @@ def simulate_enrolments_and_performance(
     return enrolments_df, performance_df
 
 
+# -----------------------------
+# Vectorised simulation engine
+# -----------------------------
+#
+# Same behavioural model as simulate_enrolments_and_performance, but the whole
+# active population is held as columnar arrays and every draw for a year is
+# made in one batch from a numpy Generator. Row-for-row output differs from the
+# loop engine (different random streams), the distributions do not.
+
+@dataclass
+class ActivePopulation:
+    """Columnar snapshot of the students still enrolled going into a year."""
+    student_idx: np.ndarray      # row positions into students_df
+    programme_idx: np.ndarray    # row positions into programmes_df
+    year_of_study: np.ndarray
+
+    @classmethod
+    def empty(cls) -> "ActivePopulation":
+        return cls(
+            student_idx=np.empty(0, dtype=np.int64),
+            programme_idx=np.empty(0, dtype=np.int64),
+            year_of_study=np.empty(0, dtype=np.int64),
+        )
+
+    def __len__(self) -> int:
+        return len(self.student_idx)
+
+    def append(self, other: "ActivePopulation") -> "ActivePopulation":
+        return ActivePopulation(
+            student_idx=np.concatenate([self.student_idx, other.student_idx]),
+            programme_idx=np.concatenate([self.programme_idx, other.programme_idx]),
+            year_of_study=np.concatenate([self.year_of_study, other.year_of_study]),
+        )
+
+    def take(self, mask: np.ndarray) -> "ActivePopulation":
+        return ActivePopulation(
+            student_idx=self.student_idx[mask],
+            programme_idx=self.programme_idx[mask],
+            year_of_study=self.year_of_study[mask],
+        )
+
+
+BAND_DTYPE = pd.CategoricalDtype(["Low", "Med", "High"])
+REGISTRATION_STATUS_DTYPE = pd.CategoricalDtype(["Registered", "Withdrawn", "Deferred"])
+
+
+@dataclass(frozen=True)
+class FactDtypes:
+    """
+    Dictionary encodings for the fact batches. Built once per simulation and
+    shared by every yearly batch, so batches concatenate (and register in DuckDB
+    as ENUMs) without being re-encoded.
+    """
+    student_id: pd.CategoricalDtype
+    programme_id: pd.CategoricalDtype
+    academic_year: pd.CategoricalDtype
+
+    @classmethod
+    def build(cls, cfg: Config, students_df: pd.DataFrame, programmes: ProgrammeIndex) -> "FactDtypes":
+        return cls(
+            student_id=pd.CategoricalDtype(students_df["student_id"].to_numpy()),
+            programme_id=pd.CategoricalDtype(programmes.programme_ids),
+            academic_year=pd.CategoricalDtype(list(cfg.academic_years), ordered=True),
+        )
+
+
+def _band(values: np.ndarray, low: float, high: float) -> pd.Categorical:
+    # Mirrors gpa_band / attendance_band: < low -> Low, < high -> Med, else High
+    codes = (values >= low).astype(np.int8) + (values >= high)
+    return pd.Categorical.from_codes(codes, dtype=BAND_DTYPE)
+
+
+def _retention_probability_vec(
+    gpa: np.ndarray,
+    attendance: np.ndarray,
+    access: np.ndarray,
+    difficulty: np.ndarray,
+) -> np.ndarray:
+    p = np.full(len(gpa), 0.88)
+
+    # GPA adjustments
+    p -= np.select([gpa < 2.0, gpa < 2.8], [0.18, 0.07], default=0.0)
+    p += np.where(gpa >= 3.2, 0.03, 0.0)
+
+    # Attendance adjustments
+    p -= np.where(attendance < 70, 0.10, 0.0)
+    p += np.where(attendance >= 90, 0.02, 0.0)
+
+    # Access adjustment
+    p -= np.where(access == 1, 0.04, 0.0)
+
+    # Programme difficulty multiplier
+    p = p * difficulty
+
+    return np.clip(p, 0.05, 0.98)
+
+
+def simulate_year_vectorized(
+    cfg: Config,
+    rng: np.random.Generator,
+    academic_year: str,
+    population: ActivePopulation,
+    students_df: pd.DataFrame,
+    programmes: ProgrammeIndex,
+    is_final_year: bool,
+    dtypes: FactDtypes | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame, ActivePopulation]:
+    """
+    Simulates one academic year for the whole active population.
+    Returns the year's enrolment rows, performance rows and the population
+    carried into the next year. Id, year, band and status columns are
+    Categoricals (codes are the population's row positions).
+    """
+    n = len(population)
+    dtypes = dtypes or FactDtypes.build(cfg, students_df, programmes)
+    access_by_student = students_df["access_flag"].to_numpy(dtype=np.int64)
+
+    difficulty = programmes.difficulty[population.programme_idx]
+    access = access_by_student[population.student_idx]
+
+    # Performance
+    gpa_mean = 2.85 + (difficulty - 0.75) * 1.2 + np.where(access == 1, -0.10, 0.0)
+    gpa = np.clip(rng.normal(gpa_mean, 0.45), 1.0, 4.0)
+    attendance = np.clip(55 + gpa * 12.5 + rng.normal(0, 8, size=n), 30, 100)
+
+    student_ids = pd.Categorical.from_codes(population.student_idx, dtype=dtypes.student_id)
+    year = pd.Categorical.from_codes(
+        np.full(n, cfg.academic_years.index(academic_year), dtype=np.int8), dtype=dtypes.academic_year
+    )
+
+    performance_df = pd.DataFrame(
+        {
+            "student_id": student_ids,
+            "academic_year": year,
+            "gpa": np.round(gpa, 2),
+            "attendance_rate": np.round(attendance, 1),
+        }
+    )
+    enrolments_df = pd.DataFrame(
+        {
+            "student_id": student_ids,
+            "programme_id": pd.Categorical.from_codes(population.programme_idx, dtype=dtypes.programme_id),
+            "academic_year": year,
+            "year_of_study": population.year_of_study,
+            "registration_status": pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), dtype=REGISTRATION_STATUS_DTYPE),
+            "credits_attempted": programmes.credits[population.programme_idx],
+            "entrant_flag": (population.year_of_study == 1).astype(np.int64),
+            "gpa_band": _band(gpa, 2.0, 3.2),
+            "attendance_band": _band(attendance, 70, 90),
+        }
+    )
+
+    if is_final_year:
+        return enrolments_df, performance_df, ActivePopulation.empty()
+
+    carried = advance_population(cfg, rng, population, programmes, gpa, attendance, access)
+    return enrolments_df, performance_df, carried
+
+
+def advance_population(
+    cfg: Config,
+    rng: np.random.Generator,
+    population: ActivePopulation,
+    programmes: ProgrammeIndex,
+    gpa: np.ndarray,
+    attendance: np.ndarray,
+    access: np.ndarray,
+) -> ActivePopulation:
+    """
+    Decides who of this year's population continues into the next year, and
+    with which programme (transfers) and year of study (repeats).
+    """
+    n = len(population)
+    difficulty = programmes.difficulty[population.programme_idx]
+
+    # Retention
+    p_ret = _retention_probability_vec(gpa, attendance, access, difficulty)
+    retained = rng.random(n) < p_ret
+
+    # Transfer within the same faculty
+    members = np.concatenate(programmes.faculty_members)
+    group_size = np.array([len(m) for m in programmes.faculty_members])
+    group_start = np.concatenate([[0], np.cumsum(group_size)[:-1]])
+
+    next_programme = population.programme_idx.copy()
+    transfer = rng.random(n) < cfg.transfer_rate
+    if transfer.any():
+        fac = programmes.faculty[next_programme[transfer]]
+        pick = (rng.random(int(transfer.sum())) * group_size[fac]).astype(np.int64)
+        next_programme[transfer] = members[group_start[fac] + pick]
+
+    # Repeat rule for low GPA
+    repeats = (gpa < 1.8) & (rng.random(n) < cfg.repeat_rate_if_low_gpa)
+    next_yos = np.where(repeats, population.year_of_study, population.year_of_study + 1)
+
+    return ActivePopulation(
+        student_idx=population.student_idx,
+        programme_idx=next_programme,
+        year_of_study=next_yos,
+    ).take(retained)
+
+
+def inject_raw_imperfections(
+    cfg: Config,
+    rng: np.random.Generator,
+    enrolments_df: pd.DataFrame,
+    performance_df: pd.DataFrame,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Batch version of the raw-ish noise applied at the end of the loop engine."""
+    # 1) Missing performance values
+    miss_n = int(len(performance_df) * cfg.missing_perf_rate)
+    if miss_n > 0:
+        miss_pos = rng.choice(len(performance_df), size=miss_n, replace=False)
+        gpa_missing = rng.random(miss_n) < 0.5
+        gpa_col = performance_df.columns.get_loc("gpa")
+        att_col = performance_df.columns.get_loc("attendance_rate")
+        performance_df.iloc[miss_pos[gpa_missing], gpa_col] = np.nan
+        performance_df.iloc[miss_pos[~gpa_missing], att_col] = np.nan
+
+    # 2) Duplicate enrolment rows
+    dup_n = int(len(enrolments_df) * cfg.duplicate_enrolment_rate)
+    if dup_n > 0:
+        dup_pos = rng.choice(len(enrolments_df), size=dup_n, replace=False)
+        enrolments_df = pd.concat([enrolments_df, enrolments_df.iloc[dup_pos]], ignore_index=True)
+
+    # 3) Status noise: some "Withdrawn" rows
+    if len(enrolments_df) > 0:
+        w_n = max(1, int(len(enrolments_df) * 0.01))
+        w_pos = rng.choice(len(enrolments_df), size=w_n, replace=False)
+        enrolments_df.iloc[w_pos, enrolments_df.columns.get_loc("registration_status")] = "Withdrawn"
+
+    return enrolments_df, performance_df
+
+
+def assign_entry_cohorts(cfg: Config, n_students: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Returns each student's entry year as an index into cfg.academic_years
+    (students beyond the last full cohort get -1 and never enrol).
+    """
+    entry_year_idx = np.full(n_students, -1, dtype=np.int64)
+    order = rng.permutation(n_students)
+    n_cohorted = min(n_students, cfg.new_entrants_per_year * len(cfg.academic_years))
+    entry_year_idx[order[:n_cohorted]] = np.arange(n_cohorted) // cfg.new_entrants_per_year
+    return entry_year_idx
+
+
+def iter_simulated_years(
+    cfg: Config,
+    students_df: pd.DataFrame,
+    programmes_df: pd.DataFrame,
+    rng: np.random.Generator,
+    entry_year_idx: np.ndarray | None = None,
+):
+    """
+    Yields (academic_year, enrolments_raw, academic_performance_raw) one year at a
+    time, with raw imperfections already applied to each batch.
+
+    entry_year_idx (see assign_entry_cohorts) fixes each student's entry cohort up
+    front; without it students are shuffled into cohorts from rng.
+    """
+    years = list(cfg.academic_years)
+    new_per_year = cfg.new_entrants_per_year
+    programmes = ProgrammeIndex.from_frame(programmes_df)
+    dtypes = FactDtypes.build(cfg, students_df, programmes)
+
+    # Shuffle students so assignment across years is random, then slice cohorts
+    order = rng.permutation(len(students_df)) if entry_year_idx is None else None
+
+    population = ActivePopulation.empty()
+    for i, yr in enumerate(years):
+        if entry_year_idx is None:
+            cohort = order[i * new_per_year : (i + 1) * new_per_year]
+        else:
+            cohort = np.flatnonzero(entry_year_idx == i)
+        entrants = ActivePopulation(
+            student_idx=cohort.astype(np.int64),
+            programme_idx=rng.integers(0, len(programmes), size=len(cohort)),
+            year_of_study=np.ones(len(cohort), dtype=np.int64),
+        )
+        population = population.append(entrants)
+
+        enrolments_df, performance_df, population = simulate_year_vectorized(
+            cfg, rng, yr, population, students_df, programmes,
+            is_final_year=(i == len(years) - 1),
+            dtypes=dtypes,
+        )
+        enrolments_df, performance_df = inject_raw_imperfections(cfg, rng, enrolments_df, performance_df)
+        yield yr, enrolments_df, performance_df
+
+
+def simulate_enrolments_and_performance_vectorized(
+    cfg: Config,
+    students_df: pd.DataFrame,
+    programmes_df: pd.DataFrame,
+    rng: np.random.Generator | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Drop-in replacement for simulate_enrolments_and_performance built on
+    iter_simulated_years. Reproducible for a given cfg.seed.
+    """
+    rng = rng if rng is not None else np.random.default_rng(cfg.seed)
+
+    enrolment_batches = []
+    performance_batches = []
+    for _, enrolments_df, performance_df in iter_simulated_years(cfg, students_df, programmes_df, rng):
+        enrolment_batches.append(enrolments_df)
+        performance_batches.append(performance_df)
+
+    return (
+        pd.concat(enrolment_batches, ignore_index=True),
+        pd.concat(performance_batches, ignore_index=True),
+    )
+
+
+# -----------------------------
+# Output writers
+# -----------------------------
+
+RAW_EXTRACTS = {
+    "students": "students_raw.csv",
+    "programmes": "programmes_raw.csv",
+    "enrolments": "enrolments_raw.csv",
+    "academic_performance": "academic_performance_raw.csv",
+}
+
+
+def partition_dirname(academic_year: str) -> str:
+    # "2022/23" -> "academic_year=2022_23" (hive-style, filesystem safe)
+    return f"academic_year={academic_year.replace('/', '_')}"
+
+
+class RawExtractWriter:
+    """
+    Writes raw extracts batch by batch so only the current batch is held in memory.
+
+    csv:     <output_dir>/<table>_raw.csv, appended to after the first batch
+    parquet: <output_dir>/<table>/[academic_year=YYYY_YY/]part-NNNNN.parquet
+    """
+
+    def __init__(self, output_dir: Path, output_format: str, clear: bool = True) -> None:
+        if output_format not in ("csv", "parquet"):
+            raise ValueError(f"Unknown output format: {output_format}")
+        self.output_dir = output_dir
+        self.output_format = output_format
+        # Shard writers share a table directory, so only the coordinating writer clears it
+        self._started: set[str] = set() if clear else set(RAW_EXTRACTS)
+        self._con = duckdb.connect() if output_format == "parquet" else None
+
+    def _start(self, table: str) -> None:
+        # Clear previous output (in either format) the first time a table is written in
+        # this run, so the loader never picks up a stale extract
+        if table in self._started:
+            return
+        self._started.add(table)
+        (self.output_dir / RAW_EXTRACTS[table]).unlink(missing_ok=True)
+        shutil.rmtree(self.output_dir / table, ignore_errors=True)
+
+    def write(self, table: str, df: pd.DataFrame, academic_year: str | None = None, part: int = 0) -> None:
+        self._start(table)
+
+        if self.output_format == "csv":
+            path = self.output_dir / RAW_EXTRACTS[table]
+            df.to_csv(path, mode="a", header=not path.exists(), index=False)
+            return
+
+        target_dir = self.output_dir / table
+        if academic_year is not None:
+            target_dir = target_dir / partition_dirname(academic_year)
+        target_dir.mkdir(parents=True, exist_ok=True)
+
+        self._con.register("batch_df", df)
+        self._con.execute(
+            f"copy batch_df to '{(target_dir / f'part-{part:05d}.parquet').as_posix()}' "
+            "(format parquet, compression zstd)"
+        )
+        self._con.unregister("batch_df")
+
+    def close(self) -> None:
+        if self._con is not None:
+            self._con.close()
+
+
+# -----------------------------
+# Sharded (multi-process) generation
+# -----------------------------
+
+SHARD_DIR = "_shards"
+
+
+def _simulate_shard(
+    cfg: Config,
+    shard_id: int,
+    students_df: pd.DataFrame,
+    programmes_df: pd.DataFrame,
+    entry_year_idx: np.ndarray,
+    seed_seq: np.random.SeedSequence,
+) -> int:
+    """Simulates one block of students and writes its own part files. Returns enrolment rows."""
+    rng = np.random.default_rng(seed_seq)
+
+    if cfg.output_format == "parquet":
+        writer = RawExtractWriter(cfg.output_dir, "parquet", clear=False)
+    else:
+        shard_dir = cfg.output_dir / SHARD_DIR / f"shard-{shard_id:05d}"
+        ensure_output_dir(shard_dir)
+        writer = RawExtractWriter(shard_dir, "csv")
+
+    n_rows = 0
+    for yr, enrolments_batch, performance_batch in iter_simulated_years(
+        cfg, students_df, programmes_df, rng, entry_year_idx=entry_year_idx
+    ):
+        writer.write("enrolments", enrolments_batch, academic_year=yr, part=shard_id)
+        writer.write("academic_performance", performance_batch, academic_year=yr, part=shard_id)
+        n_rows += len(enrolments_batch)
+
+    writer.close()
+    return n_rows
+
+
+def _merge_csv_shards(cfg: Config, n_shards: int) -> None:
+    # Concatenate per-shard CSVs (in shard order) into the standard single-file extracts
+    shard_root = cfg.output_dir / SHARD_DIR
+    for table in ("enrolments", "academic_performance"):
+        with open(cfg.output_dir / RAW_EXTRACTS[table], "wb") as out:
+            for shard_id in range(n_shards):
+                with open(shard_root / f"shard-{shard_id:05d}" / RAW_EXTRACTS[table], "rb") as part:
+                    header = part.readline()
+                    if shard_id == 0:
+                        out.write(header)
+                    shutil.copyfileobj(part, out)
+    shutil.rmtree(shard_root)
+
+
+def simulate_sharded(
+    cfg: Config,
+    students_df: pd.DataFrame,
+    programmes_df: pd.DataFrame,
+    writer: RawExtractWriter,
+) -> None:
+    """
+    Splits students into blocks of cfg.shard_size and simulates them on a pool of
+    cfg.workers processes. Every shard draws from its own SeedSequence child of
+    cfg.seed, so the output depends on seed and shard_size but not on the worker
+    count.
+    """
+    n_shards = max(1, -(-len(students_df) // cfg.shard_size))
+    cohort_seq, *shard_seqs = np.random.SeedSequence(cfg.seed).spawn(n_shards + 1)
+    entry_year_idx = assign_entry_cohorts(cfg, len(students_df), np.random.default_rng(cohort_seq))
+
+    # Let the coordinating writer clear previous output before any shard writes
+    writer._start("enrolments")
+    writer._start("academic_performance")
+
+    with ProcessPoolExecutor(max_workers=cfg.workers) as pool:
+        futures = []
+        for shard_id in range(n_shards):
+            rows = slice(shard_id * cfg.shard_size, (shard_id + 1) * cfg.shard_size)
+            futures.append(
+                pool.submit(
+                    _simulate_shard,
+                    cfg,
+                    shard_id,
+                    students_df.iloc[rows].reset_index(drop=True),
+                    programmes_df,
+                    entry_year_idx[rows],
+                    shard_seqs[shard_id],
+                )
+            )
+        n_rows = sum(f.result() for f in futures)
+
+    if cfg.output_format == "csv":
+        _merge_csv_shards(cfg, n_shards)
+
+    print(f"  {n_shards} shards on {cfg.workers} workers: {n_rows:,} enrolments written")
+
+
+# -----------------------------
+# Delta (CDC) extracts
+# -----------------------------
+#
+# The first --delta run after a snapshot derives student_state from the
+# snapshot's extracts: who is enrolled (Registered) in its final academic year,
+# with programme, year of study, marks as extracted and access flag, plus
+# counters in student_state.json. Each --delta run continues the simulation
+# from there by one academic year, writes only the changes and advances the
+# state:
+#
+#   <output_dir>/deltas/<table>/delta-NNNNNN.{csv,parquet}
+#
+# Rows carry `op` (I insert, U update, D delete; I and U rows are full row
+# images) and `seq`, which increases across tables and runs. A duplicated
+# enrolment keeps the seq of the row it repeats, like an event delivered twice.
+
+DELTA_DIR = "deltas"
+STATE_DIR = "_state"
+STATE_FILE = "student_state.parquet"
+STATE_META = "student_state.json"
+
+
+def next_academic_year(academic_year: str) -> str:
+    # "2024/25" -> "2025/26"
+    start = int(academic_year[:4]) + 1
+    return f"{start}/{(start + 1) % 100:02d}"
+
+
+def _extract_reader(output_dir: Path, table: str) -> str:
+    """DuckDB scan of one written raw extract, Parquet layout first (as the loader does)."""
+    parquet_dir = output_dir / table
+    if parquet_dir.is_dir():
+        return f"read_parquet('{parquet_dir.as_posix()}/**/*.parquet', hive_partitioning=false)"
+    return f"read_csv_auto('{(output_dir / RAW_EXTRACTS[table]).as_posix()}', header=true)"
+
+
+def save_student_state(output_dir: Path, state: pd.DataFrame, meta: dict) -> None:
+    state_dir = output_dir / STATE_DIR
+    ensure_output_dir(state_dir)
+    con = duckdb.connect()
+    con.register("state_df", state)
+    con.execute(f"copy state_df to '{(state_dir / STATE_FILE).as_posix()}' (format parquet)")
+    con.close()
+    with open(state_dir / STATE_META, "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def load_student_state(output_dir: Path) -> tuple[pd.DataFrame, dict]:
+    state_dir = output_dir / STATE_DIR
+    if not (state_dir / STATE_META).exists():
+        raise FileNotFoundError(f"No student_state in {state_dir}; generate a full snapshot into {output_dir} first")
+    with open(state_dir / STATE_META) as f:
+        meta = json.load(f)
+    con = duckdb.connect()
+    state = con.execute(f"select * from read_parquet('{(state_dir / STATE_FILE).as_posix()}')").df()
+    con.close()
+    return state, meta
+
+
+def persist_student_state(cfg: Config) -> int:
+    """
+    Saves the snapshot's final-year population as student_state. It is read back
+    from the written extracts, so it is the same for every engine and layout.
+    Returns the number of students carried.
+    """
+    if not (cfg.output_dir / "students").is_dir() and not (cfg.output_dir / RAW_EXTRACTS["students"]).exists():
+        raise FileNotFoundError(f"No raw extracts in {cfg.output_dir}; generate a full snapshot there first")
+    con = duckdb.connect()
+    enrolments = _extract_reader(cfg.output_dir, "enrolments")
+    performance = _extract_reader(cfg.output_dir, "academic_performance")
+    students = _extract_reader(cfg.output_dir, "students")
+    # The snapshot's own final year, whatever Config the --delta run was given
+    final_year = con.execute(f"select max(academic_year) from {enrolments}").fetchone()[0]
+    state = con.execute(
+        f"""
+        with e as (
+            select student_id, any_value(programme_id) as programme_id, any_value(year_of_study) as year_of_study
+            from {enrolments}
+            where academic_year = $year and registration_status = 'Registered'
+            group by student_id
+        ),
+        p as (
+            select student_id, any_value(gpa) as gpa, any_value(attendance_rate) as attendance_rate
+            from {performance}
+            where academic_year = $year
+            group by student_id
+        )
+        select
+            e.student_id, e.programme_id, e.year_of_study::bigint as year_of_study,
+            p.gpa::double as gpa, p.attendance_rate::double as attendance_rate,
+            coalesce(s.access_flag, 0)::bigint as access_flag
+        from e
+        left join p on e.student_id = p.student_id
+        left join {students} s on e.student_id = s.student_id
+        order by e.student_id
+        """,
+        {"year": final_year},
+    ).df()
+    last_student = con.execute(
+        f"select max(cast(regexp_extract(student_id, '[0-9]+$') as bigint)) from {students}"
+    ).fetchone()[0]
+    con.close()
+
+    meta = {"academic_year": final_year, "batch": 0, "next_seq": 1, "next_student_number": int(last_student) + 1}
+    save_student_state(cfg.output_dir, state, meta)
+    return len(state)
+
+
+def _change_rows(df: pd.DataFrame, op: str, first_seq: int) -> pd.DataFrame:
+    """df with op and seq columns in front (one sequence number per row)."""
+    return pd.concat(
+        [pd.DataFrame({"op": op, "seq": np.arange(first_seq, first_seq + len(df))}, index=df.index), df],
+        axis=1,
+    )
+
+
+def write_changes(output_dir: Path, output_format: str, table: str, df: pd.DataFrame, batch: int) -> Path:
+    target_dir = output_dir / DELTA_DIR / table
+    ensure_output_dir(target_dir)
+    path = target_dir / f"delta-{batch:06d}.{output_format}"
+    df = df.sort_values("seq", kind="stable")
+    if output_format == "csv":
+        df.to_csv(path, index=False)
+    else:
+        con = duckdb.connect()
+        con.register("changes_df", df)
+        con.execute(f"copy changes_df to '{path.as_posix()}' (format parquet, compression zstd)")
+        con.close()
+    return path
+
+
+def generate_delta(cfg: Config) -> dict[str, int]:
+    """
+    Simulates the academic year after the persisted student_state and writes its
+    changes: new students, enrolments and marks (I), late corrections to last
+    year's marks (U) and withdrawals of new-year enrolments (U). Advances
+    student_state. Returns change rows per table.
+    """
+    state, meta = load_student_state(cfg.output_dir)
+    batch = meta["batch"] + 1
+    prev_year = meta["academic_year"]
+    year = next_academic_year(prev_year)
+    # Own stream per batch, so deltas replay identically from the same state
+    rng = np.random.default_rng([cfg.seed, 0x4344, batch])
+
+    con = duckdb.connect()
+    programmes_df = con.execute(f"select * from {_extract_reader(cfg.output_dir, 'programmes')} order by programme_id").df()
+    con.close()
+    programmes = ProgrammeIndex.from_frame(programmes_df)
+
+    # 1) Late marks for last year: every missing value plus a share of revisions.
+    # They arrive before progression is decided, so retention uses the corrected marks.
+    gpa = state["gpa"].to_numpy(dtype=float, na_value=np.nan, copy=True)
+    attendance = state["attendance_rate"].to_numpy(dtype=float, na_value=np.nan, copy=True)
+    revised = rng.choice(len(state), size=int(len(state) * cfg.correction_rate), replace=False)
+    fix = np.union1d(np.flatnonzero(np.isnan(gpa) | np.isnan(attendance)), revised)
+    gpa[fix] = np.round(np.clip(
+        np.where(np.isnan(gpa[fix]), rng.normal(2.85, 0.45, len(fix)), gpa[fix] + rng.normal(0, 0.25, len(fix))), 1.0, 4.0
+    ), 2)
+    attendance[fix] = np.round(np.clip(
+        np.where(np.isnan(attendance[fix]), 55 + gpa[fix] * 12.5 + rng.normal(0, 8, len(fix)), attendance[fix] + rng.normal(0, 3, len(fix))),
+        30, 100,
+    ), 1)
+    corrections = pd.DataFrame(
+        {
+            "student_id": state["student_id"].to_numpy()[fix],
+            "academic_year": prev_year,
+            "gpa": gpa[fix],
+            "attendance_rate": attendance[fix],
+        }
+    )
+
+    # 2) Progress last year's population and add the new cohort
+    continuing = advance_population(
+        cfg,
+        rng,
+        ActivePopulation(
+            student_idx=np.arange(len(state), dtype=np.int64),
+            programme_idx=state["programme_id"].map(programmes.codes).to_numpy(dtype=np.int64),
+            year_of_study=state["year_of_study"].to_numpy(dtype=np.int64),
+        ),
+        programmes,
+        gpa,
+        attendance,
+        state["access_flag"].to_numpy(dtype=np.int64),
+    )
+    new_students = generate_students_vectorized(cfg, cfg.new_entrants_per_year, rng)
+    new_students["student_id"] = _student_ids(len(new_students), start=meta["next_student_number"])
+    entrants = ActivePopulation(
+        student_idx=len(state) + np.arange(len(new_students), dtype=np.int64),
+        programme_idx=rng.integers(0, len(programmes), size=len(new_students)),
+        year_of_study=np.ones(len(new_students), dtype=np.int64),
+    )
+    students_df = pd.concat(
+        [state[["student_id", "access_flag"]], new_students[["student_id", "access_flag"]]], ignore_index=True
+    )
+    enrolments_df, performance_df, _ = simulate_year_vectorized(
+        replace(cfg, academic_years=(year,)), rng, year, continuing.append(entrants), students_df, programmes,
+        is_final_year=True,
+    )
+
+    # 3) Change rows, in event order
+    seq = meta["next_seq"]
+    students_changes = _change_rows(new_students, "I", seq)
+    seq += len(students_changes)
+    enrolment_changes = _change_rows(enrolments_df, "I", seq)
+    seq += len(enrolment_changes)
+    performance_changes = _change_rows(performance_df, "I", seq)
+    seq += len(performance_changes)
+    enrolment_changes, performance_changes = inject_raw_imperfections(cfg, rng, enrolment_changes, performance_changes)
+
+    correction_changes = _change_rows(corrections, "U", seq)
+    seq += len(correction_changes)
+
+    registered = np.flatnonzero(enrolment_changes["registration_status"].to_numpy() == "Registered")
+    withdrawals = enrolment_changes.iloc[
+        rng.choice(registered, size=int(len(enrolments_df) * cfg.withdrawal_rate), replace=False)
+    ].drop_duplicates("student_id")
+    withdrawals = _change_rows(
+        withdrawals.drop(columns=["op", "seq"]).assign(registration_status="Withdrawn"), "U", seq
+    )
+    seq += len(withdrawals)
+
+    changes = {
+        "students": students_changes,
+        "enrolments": pd.concat([enrolment_changes, withdrawals], ignore_index=True),
+        "academic_performance": pd.concat([performance_changes, correction_changes], ignore_index=True),
+    }
+    for table, df in changes.items():
+        write_changes(cfg.output_dir, cfg.output_format, table, df, batch)
+
+    # 4) The new year's Registered population becomes the next state
+    still_registered = enrolment_changes[
+        (enrolment_changes["registration_status"] == "Registered")
+        & ~enrolment_changes["student_id"].isin(withdrawals["student_id"])
+    ]
+    next_state = (
+        still_registered[["student_id", "programme_id", "year_of_study"]]
+        .astype({"student_id": str, "programme_id": str, "year_of_study": np.int64})
+        .drop_duplicates("student_id")
+        .merge(
+            performance_changes[["student_id", "gpa", "attendance_rate"]]
+            .astype({"student_id": str})
+            .drop_duplicates("student_id"),
+            on="student_id",
+            how="left",
+        )
+        .merge(students_df, on="student_id", how="left")
+        .sort_values("student_id", ignore_index=True)
+    )
+    save_student_state(
+        cfg.output_dir,
+        next_state,
+        {
+            "academic_year": year,
+            "batch": batch,
+            "next_seq": int(seq),
+            "next_student_number": meta["next_student_number"] + len(new_students),
+        },
+    )
+
+    counts = {table: len(df) for table, df in changes.items()}
+    print(f"  {year} (delta {batch:06d}, seq {meta['next_seq']:,}-{seq - 1:,}): {counts}; {len(next_state):,} students carried")
+    return counts
+
+
 # -----------------------------
 # Main
 # -----------------------------
 
-def main() -> None:
-    cfg = Config()
+def parse_args(argv: list[str] | None = None) -> Config:
+    parser = argparse.ArgumentParser(description="Generate synthetic TUS raw extracts.")
+    parser.add_argument("--engine", choices=["loop", "vectorized"], default=Config.engine)
+    parser.add_argument("--new-entrants-per-year", type=int, default=Config.new_entrants_per_year)
+    parser.add_argument("--n-programmes", type=int, default=Config.n_programmes)
+    parser.add_argument("--seed", type=int, default=Config.seed)
+    parser.add_argument("--output-dir", type=Path, default=Config.output_dir)
+    parser.add_argument("--output-format", choices=["csv", "parquet"], default=Config.output_format)
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="flush each academic year as it is generated (implies --engine vectorized)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=Config.workers,
+        help="simulate fixed-size student shards on this many processes (implies --engine vectorized)",
+    )
+    parser.add_argument("--shard-size", type=int, default=Config.shard_size)
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="continue from the persisted student_state by one academic year and write change files only",
+    )
+    parser.add_argument("--correction-rate", type=float, default=Config.correction_rate)
+    parser.add_argument("--withdrawal-rate", type=float, default=Config.withdrawal_rate)
+    parser.add_argument(
+        "--drop-deltas",
+        action="store_true",
+        help="regenerate the snapshot even though change files exist, deleting them",
+    )
+    args = parser.parse_args(argv)
+
+    return replace(
+        Config(),
+        engine="vectorized" if (args.stream or args.workers) else args.engine,
+        new_entrants_per_year=args.new_entrants_per_year,
+        n_programmes=args.n_programmes,
+        seed=args.seed,
+        output_dir=args.output_dir,
+        output_format=args.output_format,
+        stream=args.stream,
+        workers=args.workers,
+        shard_size=args.shard_size,
+        delta=args.delta,
+        correction_rate=args.correction_rate,
+        withdrawal_rate=args.withdrawal_rate,
+        drop_deltas=args.drop_deltas,
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    cfg = parse_args(argv)
     set_seeds(cfg.seed)
     ensure_output_dir(cfg.output_dir)
 
-    total_students = cfg.new_entrants_per_year * len(cfg.academic_years)
-
-    programmes = generate_programmes(cfg)
-    students = generate_students(cfg, total_students=total_students)
-    enrolments_raw, performance_raw = simulate_enrolments_and_performance(cfg, students, programmes)
+    if cfg.delta:
+        if not (cfg.output_dir / STATE_DIR / STATE_META).exists():
+            with span("generate.student_state") as sp:
+                sp.set(rows=persist_student_state(cfg))
+        with span("generate.delta") as sp:
+            counts = generate_delta(cfg)
+            sp.set(rows=sum(counts.values()))
+        print(f"✅ Delta extracts written to {cfg.output_dir / DELTA_DIR}/")
+        return
+
+    # A new snapshot starts a new change history: the change files continue the old
+    # one, so they are only deleted on request, and the next --delta derives a
+    # fresh student_state
+    changes = sorted((cfg.output_dir / DELTA_DIR).glob("*/delta-*"))
+    if changes and not cfg.drop_deltas:
+        raise FileExistsError(
+            f"{len(changes)} change files in {cfg.output_dir / DELTA_DIR} continue the current snapshot; "
+            "pass --drop-deltas to regenerate it and delete them"
+        )
+    if changes:
+        print(f"  dropping {len(changes)} change files of the previous snapshot")
+    shutil.rmtree(cfg.output_dir / DELTA_DIR, ignore_errors=True)
+    shutil.rmtree(cfg.output_dir / STATE_DIR, ignore_errors=True)
 
-    # Write outputs
-    programmes.to_csv(cfg.output_dir / "programmes_raw.csv", index=False)
-    students.to_csv(cfg.output_dir / "students_raw.csv", index=False)
-    enrolments_raw.to_csv(cfg.output_dir / "enrolments_raw.csv", index=False)
-    performance_raw.to_csv(cfg.output_dir / "academic_performance_raw.csv", index=False)
+    total_students = cfg.new_entrants_per_year * len(cfg.academic_years)
 
-    print("✅ Synthetic raw extracts written to data/raw/")
+    with span("generate.programmes") as sp:
+        programmes = generate_programmes(cfg)
+        sp.set(rows=len(programmes))
+    with span("generate.students") as sp:
+        if cfg.engine == "vectorized":
+            students = generate_students_vectorized(cfg, total_students, student_rng(cfg))
+        else:
+            students = generate_students(cfg, total_students=total_students)
+        sp.set(rows=len(students))
+
+    writer = RawExtractWriter(cfg.output_dir, cfg.output_format)
+    with span("generate.write_dimensions", format=cfg.output_format) as sp:
+        writer.write("programmes", programmes)
+        writer.write("students", students)
+        sp.set(rows=len(programmes) + len(students))
+
+    if cfg.workers > 0:
+        with span("generate.simulate_sharded", workers=cfg.workers, shard_size=cfg.shard_size):
+            simulate_sharded(cfg, students, programmes, writer)
+    elif cfg.stream:
+        # Memory stays bounded by one year's batch rather than the full history
+        rng = np.random.default_rng(cfg.seed)
+        with span("generate.simulate_stream") as sp:
+            n_rows = 0
+            for yr, enrolments_batch, performance_batch in iter_simulated_years(cfg, students, programmes, rng):
+                writer.write("enrolments", enrolments_batch, academic_year=yr)
+                writer.write("academic_performance", performance_batch, academic_year=yr)
+                n_rows += len(enrolments_batch)
+                print(f"  {yr}: {len(enrolments_batch):,} enrolments flushed")
+            sp.set(rows=n_rows)
+    else:
+        with span("generate.simulate", engine=cfg.engine) as sp:
+            if cfg.engine == "vectorized":
+                enrolments_raw, performance_raw = simulate_enrolments_and_performance_vectorized(cfg, students, programmes)
+            else:
+                enrolments_raw, performance_raw = simulate_enrolments_and_performance(cfg, students, programmes)
+            sp.set(rows=len(enrolments_raw))
+
+        with span("generate.write_facts", format=cfg.output_format) as sp:
+            if cfg.output_format == "parquet":
+                for yr in cfg.academic_years:
+                    writer.write("enrolments", enrolments_raw[enrolments_raw["academic_year"] == yr], academic_year=yr)
+                    writer.write("academic_performance", performance_raw[performance_raw["academic_year"] == yr], academic_year=yr)
+            else:
+                writer.write("enrolments", enrolments_raw)
+                writer.write("academic_performance", performance_raw)
+            sp.set(rows=len(enrolments_raw) + len(performance_raw))
+
+    writer.close()
+
+    print(f"✅ Synthetic raw extracts written to {cfg.output_dir}/")
 
 
 if __name__ == "__main__":
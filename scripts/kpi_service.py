@@ -0,0 +1,305 @@
+"""
+Local query API for the Year 1 KPIs of docs/kpi_definitions.md, answered from
+the agg_retention_kpi cube.
+
+    from kpi_service import KpiService
+    kpis = KpiService("duckdb/warehouse.duckdb")
+    kpis.kpis(by=["risk_band"], academic_year="2021/22")
+
+Queries share a small pool of read-only cursors on one database instance.
+Results are memoised in an LRU cache keyed by the data version, which is the
+raw load manifest plus the last dbt_facts build when run_pipeline.py recorded
+one. A refresh that repeats an earlier question is therefore answered from
+memory until new data is loaded.
+
+A read-only DuckDB handle still takes a file lock that keeps other processes
+from writing. With idle_seconds set, the pool closes the database after that
+long without queries, so the loader and dbt can get in. The data version is
+re-read when the pool reopens.
+
+    python scripts/kpi_service.py --by academic_year risk_band
+    python scripts/kpi_service.py --serve --port 8765        GET /kpis?by=faculty&academic_year=2021/22
+"""
+from __future__ import annotations
+
+import argparse
+from collections import OrderedDict
+from contextlib import contextmanager
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from pathlib import Path
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import duckdb
+import pandas as pd
+
+from load_raw_to_duckdb import DB_PATH, MANIFEST_TABLE
+
+STAGE_MANIFEST = "raw._stage_manifest"   # written by run_pipeline.py
+
+# Cube columns a KPI query may group or filter by
+DIMENSIONS = ("academic_year", "programme_id", "programme_name", "faculty", "campus", "risk_band", "gpa_band")
+FILTERS = ("academic_year", "programme_id", "faculty")
+
+# One KPI per docs/kpi_definitions.md entry, as re-aggregations of the cube's counts
+KPI_SQL = """
+    sum(entrant_count)::bigint as entrants,
+    sum(retention_eligible_count)::bigint as retention_eligible,
+    sum(retained_institution_count)::bigint as retained,
+    (sum(retention_eligible_count) - sum(retained_institution_count))::bigint as not_retained,
+    sum(retained_institution_count) / nullif(sum(retention_eligible_count), 0) as institutional_retention,
+    sum(retained_same_programme_count) / nullif(sum(retention_eligible_count), 0) as same_programme_retention,
+    coalesce(sum(entrant_count) filter (where risk_band = 'High'), 0)::bigint as high_risk_count,
+    coalesce(sum(entrant_count) filter (where risk_band = 'High'), 0) / nullif(sum(entrant_count), 0) as high_risk_pct,
+    sum(retained_institution_count) filter (where risk_band = 'High')
+        / nullif(sum(retention_eligible_count) filter (where risk_band = 'High'), 0) as high_risk_retention,
+    sum(risk_score_sum) / nullif(sum(entrant_count), 0) as avg_success_score
+"""
+
+
+class ConnectionPool:
+    """
+    Up to `size` read-only cursors on one database instance, opened on first
+    use. Callers block while all cursors are checked out.
+    """
+
+    def __init__(self, db_path: Path, size: int = 4) -> None:
+        self.db_path = Path(db_path)
+        self.generation = 0   # bumped every time the database is (re)opened
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._db: duckdb.DuckDBPyConnection | None = None
+        self._free: list[duckdb.DuckDBPyConnection] = []
+        self._in_use = 0
+        self._last_used = time.monotonic()
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            with self._lock:
+                if self._db is None:
+                    self._db = duckdb.connect(str(self.db_path), read_only=True)
+                    self.generation += 1
+                cur = self._free.pop() if self._free else self._db.cursor()
+                self._in_use += 1
+            try:
+                yield cur
+            finally:
+                with self._lock:
+                    self._free.append(cur)
+                    self._in_use -= 1
+                    self._last_used = time.monotonic()
+
+    def close(self, idle_seconds: float = 0.0) -> bool:
+        """Closes the database if no cursor is checked out and it has been idle long enough."""
+        with self._lock:
+            if self._db is None or self._in_use or time.monotonic() - self._last_used < idle_seconds:
+                return False
+            for cur in self._free:
+                cur.close()
+            self._free.clear()
+            self._db.close()
+            self._db = None
+            return True
+
+
+class LRUCache:
+    """Thread-safe LRU of query results with hit/miss counters."""
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def kpi_query(by: tuple[str, ...], filters: dict[str, str]) -> tuple[str, list[str]]:
+    """SQL and parameters of one KPI request over main.agg_retention_kpi."""
+    where = " and ".join(f"{col} = ?" for col in filters) or "true"
+    group = ", ".join(by)
+    sql = f"select {group + ',' if by else ''} {KPI_SQL} from main.agg_retention_kpi where {where}"
+    if by:
+        sql += f" group by {group} order by {group}"
+    return sql, list(filters.values())
+
+
+class KpiService:
+    def __init__(
+        self,
+        db_path: Path = DB_PATH,
+        pool_size: int = 4,
+        cache_size: int = 256,
+        idle_seconds: float | None = None,
+    ) -> None:
+        self.pool = ConnectionPool(db_path, pool_size)
+        self.cache = LRUCache(cache_size)
+        self._version: tuple[int, str] | None = None   # (pool generation it was read in, version)
+        self._stop = threading.Event()
+        if idle_seconds is not None:
+            threading.Thread(target=self._release_idle, args=(idle_seconds,), daemon=True).start()
+
+    def _release_idle(self, idle_seconds: float) -> None:
+        while not self._stop.wait(min(idle_seconds, 1.0)):
+            self.pool.close(idle_seconds)
+
+    def _read_version(self, cur: duckdb.DuckDBPyConnection) -> str:
+        tables = {
+            f"{schema}.{name}"
+            for schema, name in cur.execute("select schema_name, table_name from duckdb_tables()").fetchall()
+        }
+        parts = []
+        if MANIFEST_TABLE in tables:
+            parts += cur.execute(
+                f"select file_path, file_hash, loaded_at from {MANIFEST_TABLE} order by file_path, loaded_at"
+            ).fetchall()
+        if STAGE_MANIFEST in tables:
+            parts += cur.execute(f"select fingerprint, completed_at from {STAGE_MANIFEST} where stage = 'dbt_facts'").fetchall()
+        if not parts:
+            # Not built by the loader; any rewrite of the file counts as new data
+            stat = self.pool.db_path.stat()
+            parts = [(stat.st_size, stat.st_mtime_ns)]
+        return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()[:16]
+
+    def data_version(self, cur: duckdb.DuckDBPyConnection) -> str:
+        # Nothing can write while the pool holds the file, so one read per (re)open is enough
+        generation = self.pool.generation
+        if self._version is None or self._version[0] != generation:
+            self._version = (generation, self._read_version(cur))
+        return self._version[1]
+
+    def kpis(
+        self,
+        by: list[str] | tuple[str, ...] = (),
+        academic_year: str | None = None,
+        programme_id: str | None = None,
+        faculty: str | None = None,
+    ) -> list[dict]:
+        """KPI rows, one per combination of the `by` dimensions (a single row if none)."""
+        by = tuple(by)
+        unknown = [col for col in by if col not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Cannot group KPIs by {unknown}; choose from {list(DIMENSIONS)}")
+        filters = {
+            col: value
+            for col, value in (("academic_year", academic_year), ("programme_id", programme_id), ("faculty", faculty))
+            if value is not None
+        }
+
+        with self.pool.connection() as cur:
+            key = (self.data_version(cur), by, tuple(sorted(filters.items())))
+            rows = self.cache.get(key)
+            if rows is None:
+                sql, params = kpi_query(by, filters)
+                df = cur.execute(sql, params).df()
+                rows = json.loads(df.to_json(orient="records"))
+                self.cache.put(key, rows)
+        return [dict(r) for r in rows]
+
+    def stats(self) -> dict:
+        return {
+            "data_version": self._version[1] if self._version else None,
+            "cache_entries": len(self.cache),
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+            "pool_opens": self.pool.generation,
+        }
+
+    def close(self) -> None:
+        self._stop.set()
+        self.pool.close()
+
+
+def make_handler(service: KpiService) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                if url.path == "/kpis":
+                    by = [col for col in params.pop("by", "").split(",") if col]
+                    unknown = set(params) - set(FILTERS)
+                    if unknown:
+                        raise ValueError(f"Unknown parameters {sorted(unknown)}; filters are {list(FILTERS)}")
+                    self.reply(200, service.kpis(by=by, **params))
+                elif url.path == "/health":
+                    self.reply(200, service.stats())
+                else:
+                    self.reply(404, {"error": f"No route {url.path}; try /kpis or /health"})
+            except ValueError as e:
+                self.reply(400, {"error": str(e)})
+
+        def reply(self, status: int, payload) -> None:
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+    return Handler
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-path", type=Path, default=DB_PATH)
+    parser.add_argument("--by", nargs="*", default=[], choices=DIMENSIONS)
+    parser.add_argument("--academic-year", default=None)
+    parser.add_argument("--programme-id", default=None)
+    parser.add_argument("--faculty", default=None)
+    parser.add_argument("--serve", action="store_true", help="serve GET /kpis and /health on localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--idle-seconds", type=float, default=30.0, help="release the database lock after this long unused")
+    args = parser.parse_args(argv)
+
+    service = KpiService(args.db_path, pool_size=args.pool_size, idle_seconds=args.idle_seconds)
+
+    if args.serve:
+        server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(service))
+        print(f"Serving KPIs from {args.db_path} on http://127.0.0.1:{args.port}/kpis")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            service.close()
+        return
+
+    filters = {"academic_year": args.academic_year, "programme_id": args.programme_id, "faculty": args.faculty}
+    for attempt in ("cold", "cached"):
+        start = time.perf_counter()
+        rows = service.kpis(by=args.by, **filters)
+        print(f"{attempt}: {(time.perf_counter() - start) * 1000:.2f} ms")
+    print(pd.DataFrame(rows).to_string(index=False))
+    service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,481 @@
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import hashlib
 from pathlib import Path
+
 import duckdb
+import yaml
+
+from pipeline_trace import execute, span
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 RAW_DIR = PROJECT_ROOT / "data" / "raw"
 DB_PATH = PROJECT_ROOT / "duckdb" / "warehouse.duckdb"
+SOURCES_YML = PROJECT_ROOT / "dbt" / "tus_mini_bi" / "models" / "sources" / "raw_sources.yml"
 
+# raw table -> (CSV extract name, natural key that change files are applied on)
+RAW_TABLES = {
+    "students": ("students_raw.csv", ["student_id"]),
+    "programmes": ("programmes_raw.csv", ["programme_id"]),
+    "enrolments": ("enrolments_raw.csv", ["student_id", "academic_year"]),
+    "academic_performance": ("academic_performance_raw.csv", ["student_id", "academic_year"]),
+}
 
-def main() -> None:
-    if not RAW_DIR.exists():
-        raise FileNotFoundError(f"Raw data folder not found: {RAW_DIR}")
+MANIFEST_TABLE = "raw._load_manifest"
+# Academic years each load rewrote (null = every year); the incremental dbt facts
+# reprocess from the earliest year changed since their last build (macros/incremental_year_filter.sql)
+CHANGES_TABLE = "raw._load_changes"
 
-    con = duckdb.connect(str(DB_PATH))
+# Change files written by generate_data.py --delta: <raw_dir>/deltas/<table>/delta-NNNNNN.{csv,parquet}
+DELTA_DIR = "deltas"
+DELTA_COLUMNS = {"op": "VARCHAR", "seq": "BIGINT"}
 
-    # Create a dedicated schema for raw tables (optional but nice)
-    con.execute("create schema if not exists raw;")
 
-    # Helper to load CSV into a DuckDB table
-    def load_csv(table_name: str, csv_name: str) -> None:
-        csv_path = RAW_DIR / csv_name
-        if not csv_path.exists():
-            raise FileNotFoundError(f"Missing CSV: {csv_path}")
+def load_schema_registry(path: Path = SOURCES_YML) -> dict[str, dict[str, str]]:
+    """
+    Raw table -> {column: DuckDB type}, in extract column order, taken from the
+    data_type entries of the dbt raw source definition.
+    """
+    with open(path) as f:
+        sources = yaml.safe_load(f)["sources"]
+
+    registry = {}
+    for source in sources:
+        for table in source.get("tables", []):
+            columns = {c["name"]: c["data_type"] for c in table.get("columns", []) if "data_type" in c}
+            if columns:
+                registry[table["name"]] = columns
+    return registry
+
+
+@dataclass
+class SourceUnit:
+    """
+    Smallest piece of a raw table that can be reloaded on its own: a single CSV
+    extract, an unpartitioned Parquet directory, one academic_year partition, or
+    one change file.
+    """
+    table_name: str
+    files: list[Path]
+    kind: str                          # "csv" | "parquet"
+    academic_year: str | None = None   # set for academic_year=YYYY_YY partitions
+    columns: dict[str, str] = field(default_factory=dict)  # explicit schema; empty = sniff
+    delta: bool = False                # change file: op and seq columns before the table's
+
+    def reader(self) -> str:
+        paths = ", ".join(f"'{p.as_posix()}'" for p in self.files)
+        if not self.columns:
+            if self.kind == "parquet":
+                return f"read_parquet([{paths}], hive_partitioning=false)"
+            return f"read_csv_auto([{paths}], header=true)"
+
+        columns = {**DELTA_COLUMNS, **self.columns} if self.delta else self.columns
+        if self.kind == "parquet":
+            casts = ", ".join(f"cast({name} as {dtype}) as {name}" for name, dtype in columns.items())
+            return f"(select {casts} from read_parquet([{paths}], hive_partitioning=false))"
+
+        # Typed CSV scan: no sniffing, columns bound by position to the registry
+        spec = ", ".join(f"'{name}': $${dtype}$$" for name, dtype in columns.items())
+        return f"read_csv([{paths}], header=true, auto_detect=false, columns={{{spec}}})"
+
+    def single_file(self, path: Path) -> "SourceUnit":
+        return SourceUnit(self.table_name, [path], self.kind, columns=self.columns, delta=self.delta)
+
+
+def discover_units(
+    raw_dir: Path,
+    table_name: str,
+    csv_name: str,
+    columns: dict[str, str] | None = None,
+) -> list[SourceUnit]:
+    # Prefers the partitioned Parquet layout written by generate_data --output-format parquet
+    # (typed, no CSV sniffing) and falls back to the single CSV extract. Change files
+    # follow the snapshot units, one unit each, in the order they are applied.
+    return _snapshot_units(raw_dir, table_name, csv_name, columns) + _delta_units(raw_dir, table_name, columns)
+
+
+def _delta_units(raw_dir: Path, table_name: str, columns: dict[str, str] | None) -> list[SourceUnit]:
+    files = sorted((raw_dir / DELTA_DIR / table_name).glob("delta-*"), key=lambda p: p.stem)
+    return [
+        SourceUnit(table_name, [path], path.suffix[1:], columns=columns or {}, delta=True)
+        for path in files
+        if path.suffix in (".csv", ".parquet")
+    ]
+
+
+def _snapshot_units(raw_dir: Path, table_name: str, csv_name: str, columns: dict[str, str] | None) -> list[SourceUnit]:
+    parquet_dir = raw_dir / table_name
+    csv_path = raw_dir / csv_name
+
+    if parquet_dir.is_dir() and any(parquet_dir.rglob("*.parquet")):
+        units = []
+        top_level = sorted(parquet_dir.glob("*.parquet"))
+        if top_level:
+            units.append(SourceUnit(table_name, top_level, "parquet", columns=columns or {}))
+        for part_dir in sorted(p for p in parquet_dir.glob("academic_year=*") if p.is_dir()):
+            files = sorted(part_dir.glob("*.parquet"))
+            if not files:
+                continue
+            year = part_dir.name.split("=", 1)[1].replace("_", "/")
+            units.append(SourceUnit(table_name, files, "parquet", academic_year=year, columns=columns or {}))
+        return units
+
+    if csv_path.exists():
+        return [SourceUnit(table_name, [csv_path], "csv", columns=columns or {})]
+
+    raise FileNotFoundError(f"Missing extract: {csv_path} (or {parquet_dir}/)")
+
+
+def file_hash(path: Path, chunk_size: int = 8 * 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def ensure_manifest(con: duckdb.DuckDBPyConnection) -> None:
+    con.execute(
+        f"""
+        create table if not exists {MANIFEST_TABLE} (
+            table_name varchar,
+            file_path varchar,
+            file_size bigint,
+            file_mtime double,
+            file_hash varchar,
+            row_count bigint,
+            loaded_at timestamp
+        );
+        create table if not exists {CHANGES_TABLE} (
+            table_name varchar,
+            academic_year varchar,
+            loaded_at timestamp
+        );
+        """
+    )
+
+
+def record_changes(con: duckdb.DuckDBPyConnection, table_name: str, academic_years: list[str | None]) -> None:
+    """Logs the academic years a load rewrote; None stands for every year."""
+    for year in sorted(set(academic_years), key=lambda y: (y is not None, y)):
+        con.execute(f"insert into {CHANGES_TABLE} values (?, ?, current_timestamp)", [table_name, year])
+
+
+def schema_changed(con: duckdb.DuckDBPyConnection, table_name: str, columns: dict[str, str]) -> bool:
+    """True when raw.<table_name> no longer has the registry's columns and types."""
+    expected = con.execute(
+        "select " + ", ".join(f"typeof(cast(null as {dtype}))" for dtype in columns.values())
+    ).fetchone()
+    actual = con.execute(
+        """
+        select column_name, data_type
+        from information_schema.columns
+        where table_schema = 'raw' and table_name = ?
+        order by ordinal_position
+        """,
+        [table_name],
+    ).fetchall()
+    return actual != list(zip(columns, expected))
+
+
+def changed_files(con: duckdb.DuckDBPyConnection, unit: SourceUnit) -> dict[Path, str]:
+    """
+    Files of a unit that are new or differ from the manifest, with their content
+    hash. Size and mtime are checked first; the hash is only computed when either
+    has moved, and a touched-but-identical file just gets its mtime refreshed.
+    """
+    changed = {}
+    for path in unit.files:
+        stat = path.stat()
+        row = con.execute(
+            f"select file_size, file_mtime, file_hash from {MANIFEST_TABLE} where file_path = ?",
+            [path.as_posix()],
+        ).fetchone()
+        if row is None:
+            changed[path] = file_hash(path)
+            continue
+        size, mtime, digest = row
+        if size == stat.st_size and mtime == stat.st_mtime:
+            continue
+        new_digest = file_hash(path)
+        if size == stat.st_size and digest == new_digest:
+            con.execute(
+                f"update {MANIFEST_TABLE} set file_mtime = ? where file_path = ?",
+                [stat.st_mtime, path.as_posix()],
+            )
+            continue
+        changed[path] = new_digest
+    return changed
+
 
-        print(f"Loading {csv_name} -> raw.{table_name}")
-        con.execute(f"drop table if exists raw.{table_name};")
+def record_manifest(
+    con: duckdb.DuckDBPyConnection,
+    unit: SourceUnit,
+    digests: dict[Path, str] | None = None,
+    rows: int | None = None,
+) -> None:
+    """
+    Records a unit's files as loaded. With `digests` (from changed_files) only
+    those files are recorded, with the hashes already computed; the other files of
+    the unit are unchanged and keep their entries. `rows` is the row count of a
+    single-file unit when the caller already has it.
+    """
+    paths = unit.files if digests is None else [p for p in unit.files if p in digests]
+    for path in paths:
+        stat = path.stat()
+        digest = digests[path] if digests is not None else file_hash(path)
+        if rows is not None and len(unit.files) == 1:
+            n = rows
+        else:
+            n = con.execute(f"select count(*) from {unit.single_file(path).reader()}").fetchone()[0]
+        con.execute(f"delete from {MANIFEST_TABLE} where file_path = ?", [path.as_posix()])
         con.execute(
-            f"""
-            create table raw.{table_name} as
-            select *
-            from read_csv_auto('{csv_path.as_posix()}', header=true);
-            """
+            f"insert into {MANIFEST_TABLE} values (?, ?, ?, ?, ?, ?, current_timestamp)",
+            [unit.table_name, path.as_posix(), stat.st_size, stat.st_mtime, digest, n],
         )
 
-    load_csv("students", "students_raw.csv")
-    load_csv("programmes", "programmes_raw.csv")
-    load_csv("enrolments", "enrolments_raw.csv")
-    load_csv("academic_performance", "academic_performance_raw.csv")
+
+def full_load(
+    con: duckdb.DuckDBPyConnection,
+    table_name: str,
+    units: list[SourceUnit],
+    merge_key: list[str],
+    digests: dict[Path, str] | None = None,
+) -> None:
+    """
+    Rebuilds a table from its snapshot units, then re-applies every change file.
+    `digests` holds hashes the caller already computed; other files are hashed here.
+    """
+    snapshot = [u for u in units if not u.delta]
+    files = [p for u in snapshot for p in u.files]
+    reader = SourceUnit(table_name, files, snapshot[0].kind, columns=snapshot[0].columns).reader()
+
+    con.execute(f"drop table if exists raw.{table_name};")
+    execute(
+        con,
+        f"""
+        create table raw.{table_name} as
+        select *
+        from {reader};
+        """,
+    )
+    con.execute(f"delete from {MANIFEST_TABLE} where table_name = ?", [table_name])
+    record_changes(con, table_name, [None])
+    digests = digests or {}
+    for unit in units:
+        known = {p: digests.get(p) or file_hash(p) for p in unit.files}
+        if unit.delta:
+            apply_delta(con, unit, merge_key, known)
+        else:
+            record_manifest(con, unit, known)
+
+
+def replace_partition(
+    con: duckdb.DuckDBPyConnection, unit: SourceUnit, digests: dict[Path, str] | None = None
+) -> None:
+    """Replaces every row of one changed academic_year partition with the partition's files."""
+    table_name = unit.table_name
+    con.execute(f"delete from raw.{table_name} where academic_year = ?", [unit.academic_year])
+    execute(con, f"insert into raw.{table_name} by name select * from {unit.reader()};")
+    record_manifest(con, unit, digests)
+    record_changes(con, table_name, [unit.academic_year])
+
+
+def apply_delta(
+    con: duckdb.DuckDBPyConnection,
+    unit: SourceUnit,
+    merge_key: list[str],
+    digests: dict[Path, str] | None = None,
+    academic_years: list[str] | None = None,
+) -> None:
+    """
+    Applies one change file on the table's natural key. Per key, the rows with the
+    highest seq win (several when an event was delivered twice). They replace
+    the key's current rows, or just remove them when the op is a delete.
+
+    With `academic_years`, only the file's rows of those years are applied again,
+    over snapshot partitions that were just replaced; the file itself is already
+    in the manifest and is not recorded again.
+
+    The academic years of the changed rows are logged; for tables keyed without
+    one (students, programmes) a change to an existing key counts as every year,
+    while new keys only reach the facts through their enrolments.
+    """
+    table_name = unit.table_name
+    keys = ", ".join(merge_key)
+    where = "" if academic_years is None else "where academic_year in (select unnest($years))"
+    con.execute(
+        f"""
+        create or replace temp table _delta_{table_name} as
+        select * from {unit.reader()}
+        {where}
+        qualify seq = max(seq) over (partition by {keys});
+        """,
+        {} if academic_years is None else {"years": academic_years},
+    )
+    on = " and ".join(f"t.{k} = s.{k}" for k in merge_key)
+    if "academic_year" in merge_key:
+        years = [r[0] for r in con.execute(f"select distinct academic_year from _delta_{table_name}").fetchall()]
+    else:
+        existing = con.execute(
+            f"select count(*) from raw.{table_name} t join _delta_{table_name} s on {on}"
+        ).fetchone()[0]
+        years = [None] if existing else []
+    con.execute(f"delete from raw.{table_name} t using _delta_{table_name} s where {on};")
+    execute(
+        con,
+        f"insert into raw.{table_name} by name select * exclude (op, seq) from _delta_{table_name} where op <> 'D';",
+    )
+    rows = con.execute(f"select count(*) from _delta_{table_name}").fetchone()[0]
+    con.execute(f"drop table _delta_{table_name};")
+    if academic_years is None:
+        record_manifest(con, unit, digests, rows=rows)
+    record_changes(con, table_name, years)
+
+
+def load_table(
+    con: duckdb.DuckDBPyConnection,
+    raw_dir: Path,
+    table_name: str,
+    full_refresh: bool = False,
+    columns: dict[str, str] | None = None,
+) -> str:
+    """Loads one raw table incrementally. Returns a short description of what was done."""
+    csv_name, merge_key = RAW_TABLES[table_name]
+    units = discover_units(raw_dir, table_name, csv_name, columns)
+    current_paths = {p.as_posix() for u in units for p in u.files}
+
+    table_exists = con.execute(
+        "select count(*) from information_schema.tables where table_schema = 'raw' and table_name = ?",
+        [table_name],
+    ).fetchone()[0] > 0
+    known_paths = {
+        r[0] for r in con.execute(
+            f"select file_path from {MANIFEST_TABLE} where table_name = ?", [table_name]
+        ).fetchall()
+    }
+
+    # No usable history (first load, format switch, forced, or change files that
+    # were already applied have gone, e.g. after a new snapshot) -> rebuild from scratch
+    removed = {Path(p) for p in known_paths - current_paths}
+    delta_removed = any(p.parent.parent.name == DELTA_DIR for p in removed)
+    if full_refresh or not table_exists or not (known_paths & current_paths) or delta_removed:
+        full_load(con, table_name, units, merge_key)
+        return "full load"
+    # raw_sources.yml was edited: unchanged files still have to be re-read with the new types
+    if columns and schema_changed(con, table_name, columns):
+        full_load(con, table_name, units, merge_key)
+        return "full load (schema changed)"
+
+    # A whole-table extract (CSV, or unpartitioned Parquet) that changed may also have
+    # lost rows, which no key merge can see, so the table is rebuilt from it
+    snapshot = [u for u in units if not u.delta]
+    changed = {u.files[0]: changed_files(con, u) for u in snapshot}
+    lost_files = {u.files[0]: any(p.parent == u.files[0].parent for p in removed) for u in snapshot}
+    if any(changed[u.files[0]] or lost_files[u.files[0]] for u in snapshot if u.academic_year is None):
+        full_load(con, table_name, units, merge_key, {p: d for c in changed.values() for p, d in c.items()})
+        return "full load (extract changed)"
+
+    # Files that disappeared from a partition force that partition to be re-applied;
+    # a partition directory that vanished entirely has its academic year deleted
+    applied = []
+    replaced = []
+    for unit in snapshot:
+        if lost_files[unit.files[0]]:
+            replace_partition(con, unit)
+        elif changed[unit.files[0]]:
+            replace_partition(con, unit, changed[unit.files[0]])
+        else:
+            continue
+        applied.append(unit.academic_year)
+        replaced.append(unit.academic_year)
+
+    live_dirs = {u.files[0].parent for u in units if u.academic_year is not None}
+    for part_dir in sorted({p.parent for p in removed} - live_dirs):
+        if part_dir.name.startswith("academic_year="):
+            year = part_dir.name.split("=", 1)[1].replace("_", "/")
+            con.execute(f"delete from raw.{table_name} where academic_year = ?", [year])
+            # The year has left dim_academic_year, so neighbouring years are found by reprocessing all
+            record_changes(con, table_name, [None])
+            applied.append(f"{year} (removed)")
+
+    # Change files last, in sequence order, over the snapshot. Files loaded before
+    # are applied again to the partitions just replaced, which lost their changes
+    for unit in units:
+        if not unit.delta:
+            continue
+        digests = changed_files(con, unit)
+        if digests:
+            apply_delta(con, unit, merge_key, digests)
+            applied.append(unit.files[0].stem)
+        elif replaced:
+            apply_delta(con, unit, merge_key, academic_years=replaced)
+
+    if removed:
+        con.execute(
+            f"delete from {MANIFEST_TABLE} where table_name = ? and file_path in (select unnest(?))",
+            [table_name, sorted(p.as_posix() for p in removed)],
+        )
+
+    return f"merged {', '.join(applied)}" if applied else "unchanged, skipped"
+
+
+def load_raw_tables(con: duckdb.DuckDBPyConnection, raw_dir: Path, full_refresh: bool = False) -> dict[str, str]:
+    """Loads every raw table on the given connection. Returns table -> outcome."""
+    # Create a dedicated schema for raw tables (optional but nice)
+    con.execute("create schema if not exists raw;")
+    ensure_manifest(con)
+
+    # The four tables are independent, so load them concurrently on separate cursors
+    registry = load_schema_registry()
+
+    def load(table_name: str) -> str:
+        cur = con.cursor()
+        try:
+            with span(f"load.{table_name}") as s:
+                outcome = load_table(
+                    cur, raw_dir, table_name,
+                    full_refresh=full_refresh,
+                    columns=registry.get(table_name),
+                )
+                s.set(outcome=outcome, rows=cur.execute(f"select count(*) from raw.{table_name}").fetchone()[0])
+            return outcome
+        finally:
+            cur.close()
+
+    with ThreadPoolExecutor(max_workers=len(RAW_TABLES)) as pool:
+        return dict(zip(RAW_TABLES, pool.map(load, RAW_TABLES)))
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Load raw extracts into DuckDB (incremental by default).")
+    parser.add_argument("--full-refresh", action="store_true", help="drop and reload every raw table")
+    parser.add_argument("--raw-dir", type=Path, default=RAW_DIR)
+    parser.add_argument("--db-path", type=Path, default=DB_PATH)
+    args = parser.parse_args(argv)
+
+    if not args.raw_dir.exists():
+        raise FileNotFoundError(f"Raw data folder not found: {args.raw_dir}")
+
+    args.db_path.parent.mkdir(parents=True, exist_ok=True)
+    con = duckdb.connect(str(args.db_path))
+
+    outcomes = load_raw_tables(con, args.raw_dir, full_refresh=args.full_refresh)
+    for table_name, outcome in outcomes.items():
+        print(f"raw.{table_name}: {outcome}")
 
     # Basic row counts
     print("\nRow counts in DuckDB:")
-    for t in ["students", "programmes", "enrolments", "academic_performance"]:
+    for t in RAW_TABLES:
         n = con.execute(f"select count(*) from raw.{t};").fetchone()[0]
         print(f"raw.{t}: {n:,}")
 
     con.close()
-    print(f"\n✅ Loaded raw tables into DuckDB: {DB_PATH}")
+    print(f"\n✅ Loaded raw tables into DuckDB: {args.db_path}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,273 @@
+"""
+Shared instrumentation for the pipeline scripts.
+
+Every stage wraps its steps in span(...), which appends one JSON line per span
+to logs/pipeline_trace.jsonl: wall time, row count, process peak RSS and the
+RSS growth over the span (null on Windows, which has no getrusage). Spans from
+one pipeline run share a run_id (PIPELINE_RUN_ID, generated if unset) so
+generate -> load -> dbt -> export can be reported together.
+
+Opt-in deep profiling of a single step:
+    PIPELINE_PROFILE=<span name>  cProfile that span (logs/profiles/<span>.prof + top functions)
+    PIPELINE_EXPLAIN=<span name>  run its DuckDB statements through EXPLAIN ANALYZE
+                                  (logs/profiles/<span>.plan.txt); "*" matches every span
+
+run_pipeline.py records every dbt node it builds under its dbt stage spans. For
+a dbt run made by hand, merge its timings into the latest run's report:
+    python scripts/pipeline_trace.py report --dbt-run-results dbt/tus_mini_bi/target/run_results.json
+"""
+from __future__ import annotations
+
+import argparse
+from contextlib import contextmanager
+from contextvars import ContextVar
+import cProfile
+from datetime import datetime, timezone
+import io
+import json
+import os
+from pathlib import Path
+import pstats
+import sys
+import time
+import uuid
+
+try:
+    import resource
+except ImportError:  # Windows: no getrusage, peak RSS is reported as unavailable
+    resource = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+TRACE_PATH = Path(os.environ.get("PIPELINE_TRACE", PROJECT_ROOT / "logs" / "pipeline_trace.jsonl"))
+PROFILE_DIR = PROJECT_ROOT / "logs" / "profiles"
+
+RUN_ID = os.environ.setdefault("PIPELINE_RUN_ID", uuid.uuid4().hex[:12])
+
+_current_span: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+
+
+def _maxrss_mb(who: int) -> float:
+    maxrss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is bytes on macOS, KiB elsewhere
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def peak_rss_mb() -> float | None:
+    """Peak RSS of this process in MB, or None where the platform has no getrusage."""
+    if resource is None:
+        return None
+    return _maxrss_mb(resource.RUSAGE_SELF)
+
+
+def children_peak_rss_mb() -> float | None:
+    """Largest peak RSS of any waited-for child process in MB, or None if unavailable."""
+    if resource is None:
+        return None
+    return _maxrss_mb(resource.RUSAGE_CHILDREN)
+
+
+def _matches(env_var: str, name: str) -> bool:
+    target = os.environ.get(env_var)
+    return target is not None and target in ("*", name)
+
+
+class Span:
+    """One timed step. Attributes set with .set(...) end up in the trace record."""
+
+    def __init__(self, name: str, attrs: dict) -> None:
+        self.name = name
+        self.attrs = dict(attrs)
+        self.parent = _current_span.get()
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    @property
+    def explain(self) -> bool:
+        return _matches("PIPELINE_EXPLAIN", self.name)
+
+
+def write_record(record: dict) -> None:
+    if os.environ.get("PIPELINE_TRACE") == "off":
+        return
+    TRACE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(TRACE_PATH, "a") as f:
+        f.write(json.dumps(record, default=str) + "\n")
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Times the enclosed block and appends a trace record for it.
+
+        with span("load.students") as s:
+            ...
+            s.set(rows=n)
+    """
+    s = Span(name, attrs)
+    token = _current_span.set(s)
+    profiler = cProfile.Profile() if _matches("PIPELINE_PROFILE", name) else None
+
+    started_at = datetime.now(timezone.utc)
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    status = "ok"
+    if profiler:
+        profiler.enable()
+    try:
+        yield s
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+        _current_span.reset(token)
+
+        rows = s.attrs.pop("rows", None)
+        rss_after = peak_rss_mb()
+        record = {
+            "run_id": RUN_ID,
+            "source": "python",
+            "span": name,
+            "parent": s.parent.name if s.parent else None,
+            "started_at": started_at.isoformat(),
+            "seconds": round(elapsed, 6),
+            "rows": rows,
+            "rows_per_sec": round(rows / elapsed, 1) if rows and elapsed > 0 else None,
+            "peak_rss_mb": None if rss_after is None else round(rss_after, 1),
+            "rss_growth_mb": None if rss_after is None else round(rss_after - rss_before, 1),
+            "status": status,
+            "pid": os.getpid(),
+            "attrs": s.attrs,
+        }
+        if profiler:
+            record["profile"] = str(_dump_profile(name, profiler))
+        write_record(record)
+
+
+def _dump_profile(name: str, profiler: cProfile.Profile) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path = PROFILE_DIR / f"{name}.prof"
+    profiler.dump_stats(path)
+
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(20)
+    print(f"\n--- cProfile: {name} ({path}) ---\n{out.getvalue()}")
+    return path
+
+
+def execute(con, sql: str, params=None):
+    """
+    con.execute(sql) inside the current span, for statements whose result set is
+    not consumed (CREATE ... AS, INSERT, COPY). When PIPELINE_EXPLAIN selects the
+    span, the statement runs as EXPLAIN ANALYZE instead (DuckDB still applies
+    its effects) and the annotated plan is saved next to the cProfile dumps.
+    """
+    s = _current_span.get()
+    if s is None or not s.explain:
+        return con.execute(sql, params) if params is not None else con.execute(sql)
+
+    rows = con.execute(f"explain analyze {sql}", params).fetchall() if params is not None else \
+        con.execute(f"explain analyze {sql}").fetchall()
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path = PROFILE_DIR / f"{s.name}.plan.txt"
+    with open(path, "a") as f:
+        f.write(f"-- {sql.strip()}\n{rows[0][1]}\n\n")
+    s.set(explain_plan=str(path))
+    return con
+
+
+def merge_dbt_run_results(path: Path, run_id: str = RUN_ID) -> int:
+    """Appends one trace record per dbt node from a run_results.json. Returns the count."""
+    with open(path) as f:
+        return record_dbt_results(json.load(f), run_id)
+
+
+def record_dbt_results(run_results: dict, run_id: str = RUN_ID, parent: str | None = None) -> int:
+    """
+    Appends one trace record per dbt node of a run_results payload, as children of
+    `parent` (default: the enclosing span, else "dbt"). Returns the count.
+    """
+    if parent is None:
+        current = _current_span.get()
+        parent = current.name if current else "dbt"
+    n = 0
+    for r in run_results["results"]:
+        started = next((t["started_at"] for t in r.get("timing", []) if t["name"] == "execute"), None)
+        rows = (r.get("adapter_response") or {}).get("rows_affected")
+        write_record(
+            {
+                "run_id": run_id,
+                "source": "dbt",
+                "span": f"dbt.{r['unique_id'].split('.')[-1]}",
+                "parent": parent,
+                "started_at": started,
+                "seconds": round(r["execution_time"], 6),
+                "rows": rows if rows is not None and rows >= 0 else None,
+                "rows_per_sec": None,
+                "peak_rss_mb": None,
+                "rss_growth_mb": None,
+                "status": r["status"],
+                "pid": None,
+                "attrs": {"unique_id": r["unique_id"], "invocation_id": run_results["metadata"].get("invocation_id")},
+            }
+        )
+        n += 1
+    return n
+
+
+def read_trace(run_id: str | None = None) -> list[dict]:
+    """Records of one run (the most recent one if run_id is None)."""
+    if not TRACE_PATH.exists():
+        return []
+    with open(TRACE_PATH) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if run_id is None and records:
+        run_id = records[-1]["run_id"]
+    return [r for r in records if r["run_id"] == run_id]
+
+
+def report(run_id: str | None = None) -> None:
+    records = read_trace(run_id)
+    if not records:
+        print(f"No trace records in {TRACE_PATH}")
+        return
+
+    print(f"=== Pipeline trace: run {records[0]['run_id']} ({len(records)} spans) ===")
+    print(f"{'span':<44}{'seconds':>10}{'rows':>12}{'rows/s':>14}{'peak MB':>10}  status")
+    for r in records:
+        rows = f"{r['rows']:,}" if r["rows"] is not None else ""
+        rate = f"{r['rows_per_sec']:,.0f}" if r["rows_per_sec"] else ""
+        peak = f"{r['peak_rss_mb']:,.0f}" if r["peak_rss_mb"] is not None else ""
+        indent = "  " if r["parent"] else ""
+        print(f"{indent + r['span']:<44}{r['seconds']:>10.3f}{rows:>12}{rate:>14}{peak:>10}  {r['status']}")
+
+    # Leaf spans only, so a stage is not "slowest" just because it contains the slowest step
+    parents = {r["parent"] for r in records}
+    leaves = [r for r in records if r["span"] not in parents] or records
+    slowest = max(leaves, key=lambda r: r["seconds"])
+    print(
+        f"\nSlowest step: {slowest['span']} ({slowest['seconds']:.3f}s). "
+        f"Re-run with PIPELINE_PROFILE={slowest['span']} or PIPELINE_EXPLAIN={slowest['span']} for detail."
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    rep = sub.add_parser("report", help="print the spans of one run")
+    rep.add_argument("--run-id", default=None, help="defaults to the most recent run")
+    rep.add_argument("--dbt-run-results", type=Path, default=None, help="merge this run_results.json into the run first")
+    args = parser.parse_args()
+
+    if args.dbt_run_results:
+        run_id = args.run_id or (read_trace() or [{"run_id": RUN_ID}])[-1]["run_id"]
+        merge_dbt_run_results(args.dbt_run_results, run_id)
+        args.run_id = run_id
+    report(args.run_id)
+
+
+if __name__ == "__main__":
+    main()
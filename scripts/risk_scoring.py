@@ -0,0 +1,217 @@
+"""
+Scores student-years with the points-based risk model of
+fact_student_success_score, in memory and without a dbt rebuild.
+
+    gpa_score         Low 2, Medium 1, High 0, Unknown 1     (gpa_band of fact_enrolment_year)
+    attendance_score  Low 2, Medium 1, High 0, Unknown 1     (attendance_band of fact_enrolment_year)
+    access_score      1 if dim_student.access_flag = 1, else 0
+    risk_band         score <= 1 Low, 2 Medium, >= 3 High
+
+A batch is any set of equal-length arrays (NumPy, or Arrow/pandas columns
+convertible with np.asarray) of student_key, gpa and attendance_rate, with NaN
+for a missing measure. Access flags are looked up from an AccessFlags table
+held in memory, so scoring never touches the warehouse.
+
+    python scripts/risk_scoring.py --check-parity                    compare with the dbt model
+    python scripts/risk_scoring.py --benchmark 1000000               time a synthetic batch
+"""
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+from functools import lru_cache
+import os
+from pathlib import Path
+import sys
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from pipeline_trace import span
+
+DB_PATH = Path(__file__).resolve().parents[1] / "duckdb" / "warehouse.duckdb"
+
+# (Low below, Medium below) thresholds of fact_enrolment_year's derived bands;
+# attendance_rate is a percentage (30-100 in the extracts)
+GPA_THRESHOLDS = (2.0, 3.2)
+ATTENDANCE_THRESHOLDS = (70.0, 90.0)
+
+# gpa_band / attendance_band labels; risk_band uses the first three
+BANDS = ("Low", "Medium", "High", "Unknown")
+BAND_DTYPE = pd.CategoricalDtype(list(BANDS))
+RISK_BANDS = BANDS[:3]
+RISK_BAND_DTYPE = pd.CategoricalDtype(list(RISK_BANDS), ordered=True)
+
+
+@dataclass(frozen=True)
+class AccessFlags:
+    """dim_student.access_flag as a dense array indexed by student_key."""
+    flags: np.ndarray   # student_key -> 0/1 (0 where the key has no student)
+
+    @classmethod
+    def from_frame(cls, students: pd.DataFrame) -> "AccessFlags":
+        """From any frame with the warehouse's student_key and access_flag columns."""
+        keys = students["student_key"].to_numpy(dtype=np.int64)
+        flags = np.zeros(keys.max() + 1 if len(keys) else 0, dtype=np.int8)
+        flags[keys] = students["access_flag"].fillna(0).to_numpy() == 1
+        return cls(flags)
+
+    @classmethod
+    def from_warehouse(cls, con: duckdb.DuckDBPyConnection) -> "AccessFlags":
+        return cls.from_frame(con.execute("select student_key, access_flag from main.dim_student").df())
+
+    def lookup(self, student_keys: np.ndarray) -> np.ndarray:
+        # Keys outside the dimension score 0, like the model's left join
+        keys = np.asarray(student_keys, dtype=np.int64)
+        known = (keys >= 0) & (keys < len(self.flags))
+        return np.where(known, self.flags[np.where(known, keys, 0)], 0).astype(np.int8)
+
+
+@lru_cache(maxsize=4)
+def _cached_access_flags(db_path: str, mtime_ns: int) -> AccessFlags:
+    con = duckdb.connect(db_path, read_only=True)
+    try:
+        return AccessFlags.from_warehouse(con)
+    finally:
+        con.close()
+
+
+def load_access_flags(db_path: Path = DB_PATH) -> AccessFlags:
+    """AccessFlags of a warehouse file, re-read only when the file has changed."""
+    return _cached_access_flags(str(db_path), os.stat(db_path).st_mtime_ns)
+
+
+def band_score(values: np.ndarray, thresholds: tuple[float, float]) -> np.ndarray:
+    """2 below the first threshold, 1 below the second, else 0; 1 where the value is missing."""
+    values = np.asarray(values, dtype=np.float64)
+    low, high = thresholds
+    score = 2 - (values >= low).astype(np.int8) - (values >= high)
+    return np.where(np.isnan(values), 1, score).astype(np.int8)
+
+
+def band_label(values: np.ndarray, thresholds: tuple[float, float]) -> pd.Categorical:
+    """The fact_enrolment_year band label behind band_score."""
+    values = np.asarray(values, dtype=np.float64)
+    codes = np.where(np.isnan(values), 3, 2 - band_score(values, thresholds))
+    return pd.Categorical.from_codes(codes, dtype=BAND_DTYPE)
+
+
+def score(
+    student_key: np.ndarray,
+    gpa: np.ndarray,
+    attendance_rate: np.ndarray,
+    access_flags: AccessFlags,
+) -> pd.DataFrame:
+    """Risk score, band and components for one batch, in input order."""
+    gpa_score = band_score(gpa, GPA_THRESHOLDS)
+    attendance_score = band_score(attendance_rate, ATTENDANCE_THRESHOLDS)
+    access_score = access_flags.lookup(student_key)
+    risk_score = gpa_score + attendance_score + access_score
+
+    # 0-1 Low, 2 Medium, 3+ High
+    band_codes = np.clip(risk_score - 1, 0, 2).astype(np.int8)
+    return pd.DataFrame(
+        {
+            "risk_score": risk_score,
+            "risk_band": pd.Categorical.from_codes(band_codes, dtype=RISK_BAND_DTYPE),
+            "gpa_score": gpa_score,
+            "attendance_score": attendance_score,
+            "access_score": access_score,
+        }
+    )
+
+
+def check_parity(con: duckdb.DuckDBPyConnection) -> int:
+    """
+    Rescores every row of fact_enrolment_year and compares it with
+    fact_student_success_score, band labels included, so a label one model
+    spells differently from the other shows up as a mismatch. Returns the
+    number of mismatched rows.
+    """
+    facts = con.execute(
+        """
+        select
+            e.student_key, e.gpa::double as gpa, e.attendance_rate::double as attendance_rate,
+            e.gpa_band, e.attendance_band,
+            k.risk_score, k.risk_band, k.gpa_score, k.attendance_score, k.access_score
+        from main.fact_enrolment_year e
+        join main.fact_student_success_score k
+          on e.student_key = k.student_key
+         and e.programme_key = k.programme_key
+         and e.academic_year_key = k.academic_year_key
+        """
+    ).df()
+
+    with span("risk_scoring.parity", rows=len(facts)):
+        scored = score(
+            facts["student_key"].to_numpy(),
+            facts["gpa"].to_numpy(dtype=float, na_value=np.nan),
+            facts["attendance_rate"].to_numpy(dtype=float, na_value=np.nan),
+            AccessFlags.from_warehouse(con),
+        )
+
+    mismatched = np.zeros(len(facts), dtype=bool)
+    for column in ("risk_score", "gpa_score", "attendance_score", "access_score"):
+        diff = facts[column].to_numpy() != scored[column].to_numpy()
+        if diff.any():
+            print(f"{column}: {diff.sum():,} rows differ")
+        mismatched |= diff
+    labels = {
+        "risk_band": scored["risk_band"],
+        "gpa_band": band_label(facts["gpa"].to_numpy(dtype=float, na_value=np.nan), GPA_THRESHOLDS),
+        "attendance_band": band_label(facts["attendance_rate"].to_numpy(dtype=float, na_value=np.nan), ATTENDANCE_THRESHOLDS),
+    }
+    for column, expected in labels.items():
+        diff = facts[column].astype(str).to_numpy() != np.asarray(expected, dtype=str)
+        if diff.any():
+            print(f"{column}: {diff.sum():,} rows differ")
+        mismatched |= diff
+
+    print(f"Parity: {len(facts) - mismatched.sum():,} of {len(facts):,} rows match fact_student_success_score")
+    return int(mismatched.sum())
+
+
+def benchmark(n: int, seed: int = 42) -> float:
+    """
+    Seconds to score n synthetic student-years (5% missing GPA / attendance),
+    with attendance drawn on the generator's 30-100 scale so every band is hit.
+    """
+    rng = np.random.default_rng(seed)
+    access_flags = AccessFlags((rng.random(max(n // 2, 1)) < 0.2).astype(np.int8))
+    student_key = rng.integers(1, len(access_flags.flags), n)
+    gpa = np.round(rng.normal(2.8, 0.6, n).clip(0, 4), 2)
+    attendance = np.round((55 + gpa * 12.5 + rng.normal(0, 8, n)).clip(30, 100), 1)
+    gpa[rng.random(n) < 0.05] = np.nan
+    attendance[rng.random(n) < 0.05] = np.nan
+
+    with span("risk_scoring.benchmark", rows=n):
+        start = time.perf_counter()
+        score(student_key, gpa, attendance, access_flags)
+        return time.perf_counter() - start
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-path", type=Path, default=DB_PATH)
+    parser.add_argument("--check-parity", action="store_true", help="rescore the warehouse facts and compare with the dbt model")
+    parser.add_argument("--benchmark", type=int, default=None, metavar="N", help="score N synthetic student-years")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        seconds = benchmark(args.benchmark)
+        print(f"Scored {args.benchmark:,} student-years in {seconds:.3f}s ({args.benchmark / seconds:,.0f} rows/s)")
+
+    if args.check_parity or not args.benchmark:
+        con = duckdb.connect(str(args.db_path), read_only=True)
+        mismatches = check_parity(con)
+        con.close()
+        if mismatches:
+            print("\n❌ Python scoring disagrees with fact_student_success_score.")
+            sys.exit(1)
+        print("\n✅ Python scoring matches fact_student_success_score.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Runs the whole pipeline in one process: generate -> load -> dbt -> audit -> export.
+
+All stages share a single DuckDB connection (dbt runs in-process through
+dbtRunner and attaches to the same database instance). Each stage has a
+fingerprint of its inputs; when it matches the one recorded after the stage's
+last successful run, the stage is skipped:
+
+    generate           Config (except the output dir and --drop-deltas) + generate_data.py
+    load               content hashes of the raw files + raw_sources.yml + loader
+    dbt_dimensions     load fingerprint + staging/dimension models and macros
+    dbt_facts          dbt_dimensions fingerprint + fact/aggregate/audit models + audit sample %
+    audit              dbt_facts fingerprint + risk_scoring.py (star schema + scorer parity)
+    export_dimensions  dbt_dimensions fingerprint + export format/dir
+    export_facts       audit fingerprint + export format/dir
+
+Stages whose dependencies are met run concurrently, so the dimensions are
+exported while the facts are still building.
+
+    python scripts/run_pipeline.py
+    python scripts/run_pipeline.py --force dbt_facts --export-format parquet
+"""
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import contextvars
+from dataclasses import asdict, dataclass
+import hashlib
+import json
+from pathlib import Path
+import time
+from typing import Callable
+
+import duckdb
+
+from audit_warehouse import failed_checks, run_audit
+from dbt_runner import DBT_PROJECT_DIR, invoke_dbt
+import export_for_tableau
+import generate_data
+from load_raw_to_duckdb import (
+    DB_PATH, MANIFEST_TABLE, RAW_DIR, RAW_TABLES, SOURCES_YML,
+    discover_units, ensure_manifest, file_hash, load_raw_tables,
+)
+from pipeline_trace import record_dbt_results, span
+from risk_scoring import check_parity
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+STAGE_MANIFEST = "raw._stage_manifest"
+
+DIMENSION_TABLES = ["dim_student", "dim_programme", "dim_academic_year"]
+FACT_TABLES = ["fact_enrolment_year", "fact_retention_outcome", "fact_student_success_score"]
+AUDIT_VIEWS = ["audit_star_schema", "audit_retention_by_risk"]
+
+
+def digest(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def files_digest(paths: list[Path]) -> str:
+    return digest([(p.relative_to(DBT_PROJECT_DIR.parents[1]).as_posix(), file_hash(p)) for p in sorted(paths)])
+
+
+def dbt_files(*subdirs: str) -> list[Path]:
+    return [p for d in subdirs for p in (DBT_PROJECT_DIR / d).rglob("*") if p.suffix in (".sql", ".yml")]
+
+
+@dataclass
+class Stage:
+    name: str
+    deps: list[str]
+    fingerprint: Callable[[dict[str, str]], str]   # upstream fingerprints -> this stage's
+    run: Callable[[], dict]                        # returns trace attributes (rows, bytes)
+    outputs_exist: Callable[[], bool] = lambda: True
+
+
+class Pipeline:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.gen_argv = [
+            "--engine", args.engine,
+            "--new-entrants-per-year", str(args.new_entrants_per_year),
+            "--seed", str(args.seed),
+            "--output-format", args.output_format,
+            "--output-dir", str(args.raw_dir),
+            "--workers", str(args.workers),
+            *(["--drop-deltas"] if args.drop_deltas else []),
+        ]
+        self.export_dir = args.export_dir or Path(export_for_tableau.EXPORT_DIRS[args.export_format])
+
+        args.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.con = duckdb.connect(str(args.db_path))
+        self.con.execute("create schema if not exists raw;")
+        ensure_manifest(self.con)
+        self.con.execute(
+            f"""
+            create table if not exists {STAGE_MANIFEST} (
+                stage varchar primary key,
+                fingerprint varchar,
+                seconds double,
+                completed_at timestamp
+            );
+            """
+        )
+
+        self.stages = {
+            s.name: s
+            for s in [
+                Stage("generate", [], self.generate_fingerprint, self.generate, self.raw_exists),
+                Stage("load", ["generate"], self.load_fingerprint, self.load),
+                Stage(
+                    "dbt_dimensions", ["load"],
+                    lambda up: digest(up["load"], files_digest(
+                        dbt_files("models/sources", "models/staging", "models/dimensions", "macros")
+                        + [DBT_PROJECT_DIR / "dbt_project.yml"]
+                    )),
+                    lambda: self.dbt(["staging", "dimensions"]),
+                ),
+                Stage(
+                    "dbt_facts", ["dbt_dimensions"],
+                    lambda up: digest(up["dbt_dimensions"], self.args.audit_sample_percent, files_digest(
+                        dbt_files("models/facts", "models/aggregates", "models/audits")
+                    )),
+                    lambda: self.dbt(["facts", "aggregates", "audits"]),
+                ),
+                Stage(
+                    "audit", ["dbt_facts"],
+                    lambda up: digest(up["dbt_facts"], file_hash(SCRIPTS_DIR / "risk_scoring.py")),
+                    self.audit,
+                ),
+                Stage(
+                    "export_dimensions", ["dbt_dimensions"],
+                    lambda up: self.export_fingerprint(up["dbt_dimensions"]),
+                    lambda: self.export(DIMENSION_TABLES),
+                    lambda: self.exports_exist(DIMENSION_TABLES),
+                ),
+                Stage(
+                    "export_facts", ["audit"],
+                    lambda up: self.export_fingerprint(up["audit"]),
+                    lambda: self.export(FACT_TABLES),
+                    lambda: self.exports_exist(FACT_TABLES),
+                ),
+            ]
+            if not (args.no_export and s.name.startswith("export_"))
+        }
+
+    # -- fingerprints ---------------------------------------------------------
+
+    def generate_fingerprint(self, up: dict[str, str]) -> str:
+        # Where the extracts are written is not an input: a copied raw directory
+        # (blue_green.py stages one per build) does not need regenerating
+        cfg = generate_data.parse_args(self.gen_argv)
+        return digest({**asdict(cfg), "output_dir": None, "drop_deltas": None}, file_hash(SCRIPTS_DIR / "generate_data.py"))
+
+    def load_fingerprint(self, up: dict[str, str]) -> str:
+        # Content hashes of the raw files; reuses the loader manifest's hash when
+        # size and mtime are unchanged so unchanged extracts are not re-read
+        hashes = []
+        for table_name, (csv_name, _) in RAW_TABLES.items():
+            for unit in discover_units(self.args.raw_dir, table_name, csv_name):
+                for path in unit.files:
+                    stat = path.stat()
+                    row = self.cursor().execute(
+                        f"select file_hash from {MANIFEST_TABLE} where file_path = ? and file_size = ? and file_mtime = ?",
+                        [path.as_posix(), stat.st_size, stat.st_mtime],
+                    ).fetchone()
+                    hashes.append((path.relative_to(self.args.raw_dir).as_posix(), row[0] if row else file_hash(path)))
+        return digest(hashes, file_hash(SOURCES_YML), file_hash(SCRIPTS_DIR / "load_raw_to_duckdb.py"))
+
+    def export_fingerprint(self, upstream: str) -> str:
+        return digest(upstream, self.args.export_format, str(self.export_dir), file_hash(SCRIPTS_DIR / "export_for_tableau.py"))
+
+    # -- stages ---------------------------------------------------------------
+
+    def raw_exists(self) -> bool:
+        try:
+            for table_name, (csv_name, _) in RAW_TABLES.items():
+                discover_units(self.args.raw_dir, table_name, csv_name)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def exports_exist(self, names: list[str]) -> bool:
+        return all((self.export_dir / f"{t}.{self.args.export_format}").exists() for t in names)
+
+    def generate(self) -> dict:
+        generate_data.main(self.gen_argv)
+        return {}
+
+    def load(self) -> dict:
+        cur = self.con.cursor()
+        try:
+            outcomes = load_raw_tables(cur, self.args.raw_dir, full_refresh=self.args.full_refresh)
+            for table_name, outcome in outcomes.items():
+                print(f"raw.{table_name}: {outcome}")
+            return {"rows": sum(cur.execute(f"select count(*) from raw.{t}").fetchone()[0] for t in RAW_TABLES)}
+        finally:
+            cur.close()
+
+    def dbt(self, selectors: list[str]) -> dict:
+        dbt_args = ["build", "--select", *selectors]
+        if self.args.full_refresh:
+            dbt_args.append("--full-refresh")
+        if self.args.audit_sample_percent is not None:
+            dbt_args += ["--vars", json.dumps({"audit_sample_percent": self.args.audit_sample_percent})]
+        # The two dbt stages never overlap, so they share a target dir (and its partial parse)
+        run_results = invoke_dbt(dbt_args, self.args.db_path, self.args.db_path.parent / "dbt", threads=self.args.threads)
+        # Per-node timings go into the trace under this stage's span
+        record_dbt_results(run_results)
+        return {"models": sum(r["unique_id"].startswith("model.") for r in run_results["results"])}
+
+    def audit(self) -> dict:
+        cur = self.con.cursor()
+        try:
+            star, timings = run_audit(cur)
+            for view in AUDIT_VIEWS[1:]:
+                print(cur.execute(f"select * from main.{view}").df().to_string(index=False))
+            # risk_scoring.py must give every student-year the score the dbt model stored
+            mismatches = check_parity(cur)
+        finally:
+            cur.close()
+
+        gaps = failed_checks(star)
+        if gaps:
+            raise RuntimeError(f"Star schema audit failed: {gaps}")
+        print(
+            f"Star schema audit passed ({int(star['enrol_rows_checked']):,} of {int(star['enrol_rows']):,} "
+            f"enrolment rows checked in {timings['audit query']:.2f}s)"
+        )
+        if mismatches:
+            raise RuntimeError(f"Risk scoring parity failed: {mismatches:,} rows differ from fact_student_success_score")
+        return {"rows": int(star["enrol_rows"]), "check_seconds": {k: round(v, 4) for k, v in timings.items()}}
+
+    def export(self, names: list[str]) -> dict:
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        results = export_for_tableau.export_tables(
+            self.con, names, self.args.export_format, str(self.export_dir), threads=len(names)
+        )
+        return {"bytes": sum(r["bytes"] for r in results)}
+
+    # -- scheduling -----------------------------------------------------------
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        # Stages run on worker threads; each statement gets its own cursor on the shared connection
+        return self.con.cursor()
+
+    def recorded_fingerprint(self, stage: str) -> str | None:
+        row = self.cursor().execute(f"select fingerprint from {STAGE_MANIFEST} where stage = ?", [stage]).fetchone()
+        return row[0] if row else None
+
+    def execute_stage(self, stage: Stage, fingerprint: str) -> str:
+        start = time.perf_counter()
+        with span(f"pipeline.{stage.name}") as s:
+            s.set(**stage.run())
+        elapsed = time.perf_counter() - start
+
+        self.cursor().execute(
+            f"insert or replace into {STAGE_MANIFEST} values (?, ?, ?, current_timestamp)",
+            [stage.name, fingerprint, elapsed],
+        )
+        return f"ran in {elapsed:.2f}s"
+
+    def run(self) -> dict[str, str]:
+        fingerprints: dict[str, str] = {}
+        outcomes: dict[str, str] = {}
+        pending = dict(self.stages)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.args.max_parallel) as pool:
+            while pending or running:
+                ready = [s for s in pending.values() if all(d in fingerprints for d in s.deps)]
+                for stage in ready:
+                    del pending[stage.name]
+                    fp = stage.fingerprint(fingerprints)
+                    forced = stage.name in self.args.force or self.args.full_refresh
+                    if not forced and fp == self.recorded_fingerprint(stage.name) and stage.outputs_exist():
+                        fingerprints[stage.name] = fp
+                        outcomes[stage.name] = "unchanged, skipped"
+                        print(f"[{stage.name}] unchanged, skipped")
+                        continue
+                    print(f"[{stage.name}] running")
+                    # In the caller's context, so the stage span nests under the "pipeline" span
+                    ctx = contextvars.copy_context()
+                    running[pool.submit(ctx.run, self.execute_stage, stage, fp)] = (stage, fp)
+
+                if not running:
+                    # Everything ready was skipped; re-check what that unblocked
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, fp = running.pop(future)
+                    outcomes[stage.name] = future.result()
+                    fingerprints[stage.name] = fp
+                    print(f"[{stage.name}] {outcomes[stage.name]}")
+
+        return outcomes
+
+    def close(self) -> None:
+        self.con.close()
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", choices=["loop", "vectorized"], default="loop")
+    parser.add_argument("--new-entrants-per-year", type=int, default=generate_data.Config.new_entrants_per_year)
+    parser.add_argument("--seed", type=int, default=generate_data.Config.seed)
+    parser.add_argument("--output-format", choices=["csv", "parquet"], default="csv", help="raw extract format")
+    parser.add_argument("--workers", type=int, default=0, help="generate_data --workers")
+    parser.add_argument("--raw-dir", type=Path, default=RAW_DIR)
+    parser.add_argument("--db-path", type=Path, default=DB_PATH)
+    parser.add_argument("--export-format", choices=sorted(export_for_tableau.EXPORT_DIRS), default="xlsx")
+    parser.add_argument("--export-dir", type=Path, default=None, help="defaults to data/tableau_exports_<format>")
+    parser.add_argument("--no-export", action="store_true", help="stop after the audit, without the export stages")
+    parser.add_argument("--threads", type=int, default=4, help="dbt threads")
+    parser.add_argument(
+        "--audit-sample-percent", type=float, default=None,
+        help="check join coverage on this %% block sample of fact_enrolment_year (default: every row)",
+    )
+    parser.add_argument("--max-parallel", type=int, default=2, help="stages run at the same time")
+    parser.add_argument("--force", nargs="+", default=[], metavar="STAGE", help="re-run these stages even if unchanged")
+    parser.add_argument(
+        "--full-refresh", action="store_true",
+        help="re-run every stage, regenerate the snapshot, reload raw tables and rebuild incremental models",
+    )
+    parser.add_argument(
+        "--drop-deltas", action="store_true",
+        help="let a snapshot regenerate delete existing change files (without it the generate stage refuses)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    pipeline = Pipeline(args)
+    unknown = set(args.force) - set(pipeline.stages)
+    if unknown:
+        raise SystemExit(f"Unknown stage(s) for --force: {', '.join(sorted(unknown))}")
+
+    start = time.perf_counter()
+    try:
+        with span("pipeline"):
+            outcomes = pipeline.run()
+    finally:
+        pipeline.close()
+
+    print("\n=== Pipeline ===")
+    for name, outcome in outcomes.items():
+        print(f"{name:<20}{outcome}")
+    print(f"\n✅ Pipeline finished in {time.perf_counter() - start:.2f}s ({args.db_path})")
+
+
+if __name__ == "__main__":
+    main()
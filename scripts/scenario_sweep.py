@@ -0,0 +1,256 @@
+"""
+What-if sweeps over the simulation parameters on one shared base population.
+
+The student and programme dimensions are generated once per (seed, volume)
+and cached under <output-dir>/base/. Each scenario only re-simulates the
+enrolment and performance facts (vectorized engine) and writes them to its own
+hive partition, so the whole sweep reads as one table with a scenario_id column:
+
+    <output-dir>/enrolments/scenario_id=<id>/part-NNNNN.parquet      (one part per academic year)
+    <output-dir>/academic_performance/scenario_id=<id>/part-NNNNN.parquet
+    <output-dir>/programmes/scenario_id=<id>/part-00000.parquet      (scenario difficulty applied)
+
+Scenarios run in parallel worker processes. A scenario whose partition was
+already written for the same base population and parameters is skipped, so
+extending a grid only simulates the new points. Every scenario uses the same
+seed (common random numbers), so differences between scenarios come from the
+parameters rather than sampling noise.
+
+    python scripts/scenario_sweep.py --transfer-rate 0.02 0.05 0.10 --difficulty-scale 0.95 1.0
+"""
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, replace
+import hashlib
+from itertools import product
+import json
+from pathlib import Path
+import shutil
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from generate_data import (
+    Config, generate_programmes, generate_students_vectorized, iter_simulated_years, set_seeds, student_rng,
+)
+from pipeline_trace import span
+
+SWEEP_DIR = Path("data/scenarios")
+FACT_TABLES = ("enrolments", "academic_performance")
+MARKER = "_scenario.json"
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """One point of a sweep: simulation parameters applied on top of the base Config."""
+    transfer_rate: float
+    repeat_rate_if_low_gpa: float
+    difficulty_scale: float = 1.0   # multiplies every programme's difficulty_factor
+
+    @property
+    def scenario_id(self) -> str:
+        return f"tr{self.transfer_rate:g}_rr{self.repeat_rate_if_low_gpa:g}_ds{self.difficulty_scale:g}"
+
+    def apply(self, cfg: Config, programmes_df: pd.DataFrame) -> tuple[Config, pd.DataFrame]:
+        cfg = replace(cfg, transfer_rate=self.transfer_rate, repeat_rate_if_low_gpa=self.repeat_rate_if_low_gpa)
+        programmes_df = programmes_df.assign(
+            difficulty_factor=np.round(np.clip(programmes_df["difficulty_factor"] * self.difficulty_scale, 0.05, 1.0), 2)
+        )
+        return cfg, programmes_df
+
+
+def base_key(cfg: Config) -> str:
+    """Identifies a base population: only the fields that shape the dimensions."""
+    fields = {
+        "seed": cfg.seed,
+        "n_programmes": cfg.n_programmes,
+        "new_entrants_per_year": cfg.new_entrants_per_year,
+        "academic_years": cfg.academic_years,
+        "students": "generate_students_vectorized",
+    }
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def ensure_base_population(cfg: Config, output_dir: Path) -> Path:
+    """Generates the dimensions into output_dir/base unless a matching cache exists."""
+    base_dir = output_dir / "base"
+    key = base_key(cfg)
+    marker = base_dir / "base.json"
+    if marker.exists() and json.loads(marker.read_text())["key"] == key:
+        print(f"Base population {key} cached in {base_dir}")
+        return base_dir
+
+    shutil.rmtree(base_dir, ignore_errors=True)
+    base_dir.mkdir(parents=True)
+    set_seeds(cfg.seed)
+    with span("sweep.base_population") as s:
+        programmes = generate_programmes(cfg)
+        students = generate_students_vectorized(
+            cfg, cfg.new_entrants_per_year * len(cfg.academic_years), student_rng(cfg)
+        )
+        s.set(rows=len(programmes) + len(students))
+
+    con = duckdb.connect()
+    for name, df in (("programmes", programmes), ("students", students)):
+        con.register("df", df)
+        con.execute(f"copy df to '{(base_dir / f'{name}.parquet').as_posix()}' (format parquet, compression zstd)")
+        con.unregister("df")
+    con.close()
+
+    marker.write_text(json.dumps({"key": key, "config": asdict(cfg)}, default=str, indent=2))
+    print(f"Base population {key} generated in {base_dir}")
+    return base_dir
+
+
+# Loaded once per worker process by _init_worker, shared by every scenario it runs
+_BASE: dict[str, pd.DataFrame] = {}
+
+
+def _init_worker(base_dir: Path) -> None:
+    con = duckdb.connect()
+    for name in ("programmes", "students"):
+        _BASE[name] = con.execute(f"select * from read_parquet('{(base_dir / f'{name}.parquet').as_posix()}')").df()
+    con.close()
+
+
+def scenario_marker(cfg: Config, scenario: Scenario) -> dict:
+    return {"base_key": base_key(cfg), "scenario": asdict(scenario), "seed": cfg.seed}
+
+
+def is_cached(output_dir: Path, cfg: Config, scenario: Scenario) -> bool:
+    path = output_dir / "enrolments" / f"scenario_id={scenario.scenario_id}" / MARKER
+    return path.exists() and json.loads(path.read_text()) == scenario_marker(cfg, scenario)
+
+
+def simulate_scenario(cfg: Config, scenario: Scenario, output_dir: Path) -> tuple[str, int]:
+    """Worker entry point: simulates one scenario year by year and writes its partitions."""
+    cfg, programmes = scenario.apply(cfg, _BASE["programmes"])
+    part_dirs = {t: output_dir / t / f"scenario_id={scenario.scenario_id}" for t in (*FACT_TABLES, "programmes")}
+    for d in part_dirs.values():
+        shutil.rmtree(d, ignore_errors=True)
+        d.mkdir(parents=True)
+
+    con = duckdb.connect()
+
+    def write(table: str, df: pd.DataFrame, part: int) -> None:
+        con.register("df", df)
+        con.execute(f"copy df to '{(part_dirs[table] / f'part-{part:05d}.parquet').as_posix()}' (format parquet, compression zstd)")
+        con.unregister("df")
+
+    write("programmes", programmes, 0)
+    n_rows = 0
+    rng = np.random.default_rng(cfg.seed)
+    with span(f"sweep.{scenario.scenario_id}") as s:
+        # Years are simulated lazily and flushed as they come, one batch in memory at a time
+        for i, (_, enrolments, performance) in enumerate(iter_simulated_years(cfg, _BASE["students"], programmes, rng)):
+            write("enrolments", enrolments, i)
+            write("academic_performance", performance, i)
+            n_rows += len(enrolments)
+        s.set(rows=n_rows)
+    con.close()
+
+    # Written last: a partition without a marker is incomplete and gets re-simulated
+    (part_dirs["enrolments"] / MARKER).write_text(json.dumps(scenario_marker(cfg, scenario)))
+    return scenario.scenario_id, n_rows
+
+
+def run_sweep(
+    cfg: Config,
+    scenarios: list[Scenario],
+    output_dir: Path = SWEEP_DIR,
+    workers: int = 4,
+    force: bool = False,
+) -> dict[str, int | None]:
+    """
+    Runs every scenario not already cached. Returns scenario_id -> enrolment rows
+    written (None for scenarios skipped as cached).
+    """
+    base_dir = ensure_base_population(cfg, output_dir)
+    results: dict[str, int | None] = {}
+    todo = []
+    for scenario in scenarios:
+        if not force and is_cached(output_dir, cfg, scenario):
+            results[scenario.scenario_id] = None
+        else:
+            todo.append(scenario)
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=max(1, min(workers, len(todo))), initializer=_init_worker, initargs=(base_dir,)) as pool:
+            for scenario_id, n_rows in pool.map(simulate_scenario, [cfg] * len(todo), todo, [output_dir] * len(todo)):
+                results[scenario_id] = n_rows
+    return results
+
+
+def create_views(con: duckdb.DuckDBPyConnection, output_dir: Path = SWEEP_DIR, schema: str = "scenario") -> None:
+    """Registers each sweep table as a view (scenario_id from the partition path)."""
+    con.execute(f"create schema if not exists {schema};")
+    con.execute(
+        f"create or replace view {schema}.students as "
+        f"select * from read_parquet('{(output_dir / 'base' / 'students.parquet').as_posix()}')"
+    )
+    for table in (*FACT_TABLES, "programmes"):
+        glob = (output_dir / table / "scenario_id=*" / "*.parquet").as_posix()
+        con.execute(
+            f"create or replace view {schema}.{table} as "
+            f"select * from read_parquet('{glob}', hive_partitioning=true)"
+        )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transfer-rate", type=float, nargs="+", default=[Config.transfer_rate])
+    parser.add_argument("--repeat-rate", type=float, nargs="+", default=[Config.repeat_rate_if_low_gpa])
+    parser.add_argument("--difficulty-scale", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--new-entrants-per-year", type=int, default=Config.new_entrants_per_year)
+    parser.add_argument("--seed", type=int, default=Config.seed)
+    parser.add_argument("--output-dir", type=Path, default=SWEEP_DIR)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--force", action="store_true", help="re-simulate scenarios even if cached")
+    args = parser.parse_args(argv)
+
+    cfg = replace(Config(), engine="vectorized", seed=args.seed, new_entrants_per_year=args.new_entrants_per_year)
+    scenarios = [Scenario(tr, rr, ds) for tr, rr, ds in product(args.transfer_rate, args.repeat_rate, args.difficulty_scale)]
+
+    results = run_sweep(cfg, scenarios, args.output_dir, workers=args.workers, force=args.force)
+    for scenario_id, n_rows in results.items():
+        print(f"{scenario_id:<32}{'cached' if n_rows is None else f'{n_rows:,} enrolments'}")
+
+    # Headline Y1 -> next-year retention per scenario, read across all partitions at once
+    con = duckdb.connect()
+    create_views(con, args.output_dir)
+    print("\n=== Y1 registrations retained into the next year, by scenario ===")
+    print(
+        con.execute(
+            """
+            with reg as (
+                select distinct scenario_id, student_id, academic_year, year_of_study
+                from scenario.enrolments
+                where registration_status = 'Registered'
+            ),
+            years as (
+                select academic_year, lead(academic_year) over (order by academic_year) as next_year
+                from (select distinct academic_year from reg)
+            )
+            select
+                y1.scenario_id,
+                round(avg(case when nxt.student_id is not null then 1.0 else 0.0 end), 3) as y1_retention
+            from reg y1
+            join years y on y1.academic_year = y.academic_year and y.next_year is not null
+            left join (select distinct scenario_id, student_id, academic_year from reg) nxt
+                on nxt.scenario_id = y1.scenario_id
+               and nxt.student_id = y1.student_id
+               and nxt.academic_year = y.next_year
+            where y1.year_of_study = 1
+            group by y1.scenario_id
+            order by y1.scenario_id
+            """
+        ).df().to_string(index=False)
+    )
+    con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,98 @@
-import pandas as pd
-
-RAW = "data/raw"
+import argparse
+from contextlib import contextmanager
+from pathlib import Path
+import sys
+import time
 
+import duckdb
+import pandas as pd
 
-def main() -> None:
-    students = pd.read_csv(f"{RAW}/students_raw.csv")
-    programmes = pd.read_csv(f"{RAW}/programmes_raw.csv")
-    enrol = pd.read_csv(f"{RAW}/enrolments_raw.csv")
-    perf = pd.read_csv(f"{RAW}/academic_performance_raw.csv")
+from arrow_access import arrow_frame
+from load_raw_to_duckdb import RAW_DIR, RAW_TABLES, discover_units, load_schema_registry
+from pipeline_trace import span
+
+# check name -> wall seconds, filled in by timed()
+TIMINGS: dict[str, float] = {}
+
+
+@contextmanager
+def timed(check: str):
+    start = time.perf_counter()
+    try:
+        with span(f"validate.{check.replace(' ', '_')}") as s:
+            yield s
+    finally:
+        TIMINGS[check] = time.perf_counter() - start
+
+
+def extract_sql(raw_dir: Path, table_name: str, columns: str, registry: dict[str, dict[str, str]]) -> str:
+    """
+    Selects `columns` from a raw table's snapshot extract, in whichever layout
+    generate_data wrote it (single CSV or academic_year-partitioned Parquet),
+    typed by the schema registry like the loader. Change files are not applied.
+    """
+    csv_name, _ = RAW_TABLES[table_name]
+    units = [u for u in discover_units(raw_dir, table_name, csv_name, registry.get(table_name)) if not u.delta]
+    if not units:
+        raise FileNotFoundError(f"No {table_name} extract under {raw_dir}")
+    return " union all ".join(f"select {columns} from {u.reader()}" for u in units)
+
+
+def y1_retention_frame(enrol: pd.DataFrame) -> pd.DataFrame:
+    """
+    Every Year-1 registration that has a following academic year, flagged with
+    whether the student is registered anywhere in that next year. Built with a
+    single merge and shared by all retention checks.
+    """
+    registered = enrol[enrol["registration_status"] == "Registered"]
+    years = sorted(enrol["academic_year"].unique().tolist())
+    next_year = dict(zip(years[:-1], years[1:]))
+
+    cohort = (
+        registered.loc[registered["year_of_study"] == 1, ["student_id", "academic_year", "programme_id", "gpa_band"]]
+        .drop_duplicates()
+        .assign(next_academic_year=lambda df: df["academic_year"].map(next_year))
+        .dropna(subset=["next_academic_year"])
+    )
+    presence = (
+        registered[["student_id", "academic_year"]]
+        .drop_duplicates()
+        .rename(columns={"academic_year": "next_academic_year"})
+        .assign(retained_next_year=1)
+    )
+
+    out = cohort.merge(presence, on=["student_id", "next_academic_year"], how="left")
+    out["retained_next_year"] = out["retained_next_year"].fillna(0).astype(int)
+    return out
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Sanity checks over the raw extracts.")
+    parser.add_argument(
+        "--budget-seconds",
+        type=float,
+        default=None,
+        help="exit non-zero if total validation wall time exceeds this (for CI gating)",
+    )
+    parser.add_argument("--raw-dir", type=Path, default=RAW_DIR)
+    args = parser.parse_args(argv)
+
+    with timed("load extracts") as s:
+        # Parsed by DuckDB straight into Arrow (only the columns the checks use);
+        # the frames wrap those buffers instead of copying them
+        registry = load_schema_registry()
+        con = duckdb.connect()
+        students, programmes, enrol, perf = (
+            arrow_frame(con, extract_sql(args.raw_dir, name, columns, registry))
+            for name, columns in (
+                ("students", "student_id"),
+                ("programmes", "programme_id"),
+                ("enrolments", "student_id, programme_id, academic_year, year_of_study, registration_status, gpa_band"),
+                ("academic_performance", "student_id, academic_year"),
+            )
+        )
+        con.close()
+        s.set(rows=len(students) + len(programmes) + len(enrol) + len(perf))
 
     print("=== Row counts ===")
     print(f"students:   {len(students):,}")
@@ -15,68 +100,64 @@ def main() -> None:
     print(f"enrolments: {len(enrol):,}")
     print(f"performance:{len(perf):,}")
 
-    print("\n=== Basic checks ===")
-    print("Unique students in enrolments:", enrol["student_id"].nunique())
-    print("Years in enrolments:", sorted(enrol["academic_year"].unique().tolist()))
-    print("Years in performance:", sorted(perf["academic_year"].unique().tolist()))
+    with timed("basic checks"):
+        print("\n=== Basic checks ===")
+        print("Unique students in enrolments:", enrol["student_id"].nunique())
+        print("Years in enrolments:", sorted(enrol["academic_year"].unique().tolist()))
+        print("Years in performance:", sorted(perf["academic_year"].unique().tolist()))
 
     # Year 1 cohort per year
-    y1 = enrol[(enrol["year_of_study"] == 1) & (enrol["registration_status"] == "Registered")]
-    print("\n=== Year-1 cohort size by year ===")
-    print(y1.groupby("academic_year")["student_id"].nunique().sort_index())
+    with timed("year-1 cohort size"):
+        y1 = enrol[(enrol["year_of_study"] == 1) & (enrol["registration_status"] == "Registered")]
+        print("\n=== Year-1 cohort size by year ===")
+        print(y1.groupby("academic_year")["student_id"].nunique().sort_index())
 
-    # Institutional retention for Year1 -> next year
-    years = sorted(enrol["academic_year"].unique().tolist())
-    print("\n=== Approx Y1 -> next-year institutional retention (by cohort year) ===")
-    for i in range(len(years) - 1):
-        y = years[i]
-        y_next = years[i + 1]
-        cohort = y1[y1["academic_year"] == y][["student_id"]].drop_duplicates()
-        next_year = enrol[(enrol["academic_year"] == y_next) & (enrol["registration_status"] == "Registered")][["student_id"]].drop_duplicates()
+    with timed("retention frame") as s:
+        ret = y1_retention_frame(enrol)
+        s.set(rows=len(ret))
 
-        retained = cohort.merge(next_year, on="student_id", how="inner")
-        rate = len(retained) / max(1, len(cohort))
-        print(f"{y} -> {y_next}: {rate:.1%}  (cohort={len(cohort):,})")
-
-    # Retention by GPA band (use Year1 records only)
-    print("\n=== Year-1 cohort: retention by GPA band (overall, approx) ===")
-    # Determine retention for first year in each cohort by checking if student appears next year
-    records = []
-    for i in range(len(years) - 1):
-        y = years[i]
-        y_next = years[i + 1]
-
-        cohort_y = y1[y1["academic_year"] == y][["student_id", "gpa_band"]].drop_duplicates()
-        next_year_students = set(
-            enrol[(enrol["academic_year"] == y_next) & (enrol["registration_status"] == "Registered")]["student_id"].unique()
+    # Institutional retention for Year1 -> next year
+    with timed("institutional retention"):
+        print("\n=== Approx Y1 -> next-year institutional retention (by cohort year) ===")
+        by_year = (
+            ret.drop_duplicates(["student_id", "academic_year"])
+            .groupby(["academic_year", "next_academic_year"])["retained_next_year"]
+            .agg(["mean", "size"])
         )
-        cohort_y["retained_next_year"] = cohort_y["student_id"].apply(lambda s: 1 if s in next_year_students else 0)
-        cohort_y["cohort_year"] = y
-        records.append(cohort_y)
+        for (y, y_next), row in by_year.iterrows():
+            print(f"{y} -> {y_next}: {row['mean']:.1%}  (cohort={int(row['size']):,})")
 
-    if records:
-        tmp = pd.concat(records, ignore_index=True)
-        print(tmp.groupby("gpa_band")["retained_next_year"].mean().sort_index().apply(lambda x: f"{x:.1%}"))
+    # Retention by GPA band (use Year1 records only)
+    with timed("retention by gpa band"):
+        print("\n=== Year-1 cohort: retention by GPA band (overall, approx) ===")
+        if len(ret):
+            by_band = ret.drop_duplicates(["student_id", "academic_year", "gpa_band"]).groupby("gpa_band")["retained_next_year"].mean()
+            print(by_band.sort_index().apply(lambda x: f"{x:.1%}"))
 
     # Programme variation check (top/bottom by retention for one cohort year)
-    if len(years) >= 2:
-        y = years[0]
-        y_next = years[1]
-        cohort_prog = y1[y1["academic_year"] == y][["student_id", "programme_id"]].drop_duplicates()
-        next_year_students = set(
-            enrol[(enrol["academic_year"] == y_next) & (enrol["registration_status"] == "Registered")]["student_id"].unique()
-        )
-        cohort_prog["retained_next_year"] = cohort_prog["student_id"].apply(lambda s: 1 if s in next_year_students else 0)
-
-        prog_ret = cohort_prog.groupby("programme_id")["retained_next_year"].mean().sort_values(ascending=False)
-        print(f"\n=== Programme retention variation ({y} cohort, institutional retention) ===")
-        print("Top 5 programmes:")
-        print(prog_ret.head(5).apply(lambda x: f"{x:.1%}"))
-        print("\nBottom 5 programmes:")
-        print(prog_ret.tail(5).apply(lambda x: f"{x:.1%}"))
+    with timed("programme variation"):
+        if len(ret):
+            y = ret["academic_year"].min()
+            first = ret[ret["academic_year"] == y].drop_duplicates(["student_id", "programme_id"])
+            prog_ret = first.groupby("programme_id")["retained_next_year"].mean().sort_values(ascending=False)
+            print(f"\n=== Programme retention variation ({y} cohort, institutional retention) ===")
+            print("Top 5 programmes:")
+            print(prog_ret.head(5).apply(lambda x: f"{x:.1%}"))
+            print("\nBottom 5 programmes:")
+            print(prog_ret.tail(5).apply(lambda x: f"{x:.1%}"))
+
+    total = sum(TIMINGS.values())
+    print("\n=== Validation timings ===")
+    for check, seconds in TIMINGS.items():
+        print(f"{check:<26}{seconds:>8.3f}s")
+    print(f"{'total':<26}{total:>8.3f}s")
+
+    if args.budget_seconds is not None and total > args.budget_seconds:
+        print(f"\n❌ Validation took {total:.2f}s, over the {args.budget_seconds:.2f}s budget.")
+        sys.exit(1)
 
     print("\n✅ Validation complete.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()